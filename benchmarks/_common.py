@@ -0,0 +1,41 @@
+"""Funzioni comuni ai benchmark: import della libreria, frame registrati e misure."""
+
+import logging
+from pathlib import Path
+import sys
+import timeit
+
+ROOT = Path(__file__).resolve().parent
+FRAMES = ROOT / "frames"
+
+# La libreria si importa da sola, senza il pacchetto Home Assistant che la contiene
+sys.path.insert(0, str(ROOT.parent / "custom_components" / "ialarm_mk2" / "libpyialarmmk"))
+
+import pyialarmmk  # noqa: E402
+
+
+def client(sock=None) -> "pyialarmmk.iAlarmMkClient":
+    """Client sincrono senza connessione, con il socket indicato."""
+    client = pyialarmmk.iAlarmMkClient("127.0.0.1", 0, "bench", "bench", logging.getLogger("benchmarks"))
+    client.sock = sock
+    return client
+
+
+def load_xml(name: str) -> bytes:
+    """Payload XML decifrato di una risposta registrata in frames/."""
+    return (FRAMES / f"{name}.xml").read_bytes().strip()
+
+
+def frame(xml: bytes, seq: int = 1) -> bytes:
+    """Frame "@ieM" completo e cifrato, come lo invia la centrale."""
+    return b"@ieM%04d%04d0000%s%04d" % (len(xml), seq, client()._xor(xml), seq)
+
+
+def measure(func, number: int) -> float:
+    """Miglior tempo medio per chiamata in secondi su cinque ripetizioni."""
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def report(name: str, old: float, new: float, unit: str = "us") -> None:
+    scale = {"us": 1e6, "ms": 1e3}[unit]
+    print(f"{name:<30} old {old * scale:9.1f} {unit}   new {new * scale:9.1f} {unit}   x{old / new:.1f}")
@@ -0,0 +1,186 @@
+"""Percorso di decodifica e codifica del client prima delle ottimizzazioni.
+
+Copia dei metodi di iAlarmMkClient della versione di partenza, usata dai
+benchmark come termine di confronto: non modificarli.
+"""
+
+import re
+import socket
+import time
+
+from lxml import etree
+import xmltodict
+
+
+class ConnectionError(Exception):
+    pass
+
+
+class ResponseError(Exception):
+    pass
+
+
+class BaselineClient:
+
+    seq = 0
+
+    def __init__(self, sock=None):
+        self.sock = sock
+
+    def _print(self, data):
+        pass
+
+    def _send(self, root):
+        xml: str = etree.tostring(self._convert_dict_to_xml(root), pretty_print=False)
+        self.seq += 1
+        mesg = b"@ieM%04d%04d0000%s%04d" % (
+            len(xml),
+            self.seq,
+            self._xor(xml),
+            self.seq,
+        )
+        self.sock.send(mesg)
+
+    def _receive(self):
+        try:
+            data = self.sock.recv(1024)
+            if data is None:
+                self._print("Data received is null")
+            else:
+                self._print(f"Data received is length: {len(data)}")
+        except socket.timeout:
+            raise ConnectionError("Connection timed out")
+        except OSError as e:
+            self.sock.shutdown(socket.SHUT_RDWR)
+            self.sock.close()
+            raise ConnectionError("Connection error")
+        return xmltodict.parse(
+            self._xor(data[16:-4]).decode(),
+            xml_attribs=False,
+            dict_constructor=dict,
+            postprocessor=self._xmlread,
+        )
+
+    def _xor(self, input):
+        sz = bytearray.fromhex(
+            "0c384e4e62382d620e384e4e44382d300f382b382b0c5a6234384e304e4c372b10535a0c20432d171142444e58422c421157322a204036172056446262382b5f0c384e4e62382d620e385858082e232c0f382b382b0c5a62343830304e2e362b10545a0c3e432e1711384e625824371c1157324220402c17204c444e624c2e12"
+        )
+        buf = bytearray(input)
+        for i in range(len(input)):
+            ki = i & 0x7F
+            buf[i] = buf[i] ^ sz[ki]
+        return buf
+
+    def _create(self, path, mydict={}):
+        root = {}
+        elem = root
+        try:
+            plist = path.strip("/").split("/")
+            k = len(plist) - 1
+            for i, j in enumerate(plist):
+                elem[j] = {}
+                if i == k:
+                    elem[j] = mydict
+                elem = elem.get(j)
+        except:
+            pass
+        return root
+
+    def _select(self, mydict, path):
+        elem = mydict
+        try:
+            for i in path.strip("/").split("/"):
+                try:
+                    i = int(i)
+                    elem = elem[i]
+                except ValueError:
+                    elem = elem.get(i)
+        except:
+            pass
+        return elem
+
+    def _xmlread(self, path, key, value):
+        try:
+            input = value
+            BOL = re.compile(r"BOL\|([FT])")
+            DTA = re.compile(r"DTA(,\d+)*\|(\d{4}\.\d{2}.\d{2}.\d{2}.\d{2}.\d{2})")
+            ERR = re.compile(r"ERR\|(\d{2})")
+            GBA = re.compile(r"GBA,(\d+)\|([0-9A-F]*)")
+            HMA = re.compile(r"HMA,(\d+)\|(\d{2}:\d{2})")
+            IPA = re.compile(r"IPA,(\d+)\|(([0-2]?\d{0,2}\.){3}([0-2]?\d{0,2}))")
+            MAC = re.compile(r"MAC,(\d+)\|(([0-9A-F]{2}[:-]){5}([0-9A-F]{2}))")
+            NEA = re.compile(r"NEA,(\d+)\|([0-9A-F]+)")
+            NUM = re.compile(r"NUM,(\d+),(\d+)\|(\d*)")
+            PWD = re.compile(r"PWD,(\d+)\|(.*)")
+            S32 = re.compile(r"S32,(\d+),(\d+)\|(\d*)")
+            STR = re.compile(r"STR,(\d+)\|(.*)")
+            TYP = re.compile(r"TYP,(\w+)\|(\d+)")
+            if BOL.match(input):
+                bol = BOL.search(input).groups()[0]
+                if bol == "T":
+                    value = True
+                if bol == "F":
+                    value = False
+            elif DTA.match(input):
+                dta = DTA.search(input).groups()[1]
+                value = time.strptime(dta, "%Y.%m.%d.%H.%M.%S")
+            elif ERR.match(input):
+                value = int(ERR.search(input).groups()[0])
+            elif GBA.match(input):
+                value = bytearray.fromhex(GBA.search(input).groups()[1]).decode()
+            elif HMA.match(input):
+                hma = HMA.search(input).groups()[1]
+                value = time.strptime(hma, "%H:%M")
+            elif IPA.match(input):
+                value = str(IPA.search(input).groups()[1])
+            elif MAC.match(input):
+                value = str(MAC.search(input).groups()[1])
+            elif NEA.match(input):
+                value = str(NEA.search(input).groups()[1])
+            elif NUM.match(input):
+                value = str(NUM.search(input).groups()[2])
+            elif PWD.match(input):
+                value = str(PWD.search(input).groups()[1])
+            elif S32.match(input):
+                value = int(S32.search(input).groups()[2])
+            elif STR.match(input):
+                value = str(STR.search(input).groups()[1])
+            elif TYP.match(input):
+                value = int(TYP.search(input).groups()[1])
+            else:
+                raise ResponseError(f"Unknown data type {format(input)}")
+            return key, value
+        except (ValueError, TypeError):
+            return key, value
+
+    @staticmethod
+    def _convert_dict_to_xml_recurse(parent: etree.Element, dictitem: dict) -> None:
+        assert not isinstance(dictitem, type([]))
+
+        if isinstance(dictitem, dict):
+            for (tag, child) in dictitem.items():
+                if isinstance(child, type([])):
+                    # iterate through the array and convert
+                    for list_child in child:
+                        elem: etree.Element = etree.Element(tag)
+                        parent.append(elem)
+                        BaselineClient._convert_dict_to_xml_recurse(elem, list_child)
+                else:
+                    elem = etree.Element(tag)
+                    parent.append(elem)
+                    BaselineClient._convert_dict_to_xml_recurse(elem, child)
+        elif dictitem is not None:
+            # None Element should be written without "None" value
+            parent.text = str(dictitem)
+
+    @staticmethod
+    def _convert_dict_to_xml(xmldict: dict):
+        # Converts a dictionary to an XML ElementTree Element
+        root_tag = list(xmldict.keys())[0]
+        root: etree.Element = etree.Element(root_tag)
+        BaselineClient._convert_dict_to_xml_recurse(root, xmldict[root_tag])
+        return root
+
+    def encode(self, xpath, cmd):
+        """XML di un comando come lo costruiva _send."""
+        return etree.tostring(self._convert_dict_to_xml(self._create(xpath, cmd)), pretty_print=False)
@@ -0,0 +1,72 @@
+"""Decodifica dei valori tipizzati: tabella per prefisso contro la cascata di regex.
+
+Usa i valori foglia delle risposte registrate in frames/ e confronta anche
+la lettura delle date DTA (struct_time con strptime contro datetime con fuso)
+su un registro di 10.000 voci GetLog.
+"""
+
+from datetime import datetime, timedelta
+import re
+import time
+
+from _common import FRAMES, measure, pyialarmmk, report
+from baseline import BaselineClient
+
+LEAF = re.compile(r">([A-Z0-9]{3}[,|][^<]*)<")
+ROWS = 10_000
+
+
+def leaves(name):
+    return LEAF.findall((FRAMES / f"{name}.xml").read_text())
+
+
+def log_rows(count):
+    """count voci di GetLog: quelle registrate in frames/, ripetute con orari tutti diversi."""
+    values = leaves("GetLog")[3:]  # Total, Offset, Ln
+    recorded = [values[i:i + 4] for i in range(0, len(values), 4)]
+    return [
+        ["DTA,19|%s" % time.strftime("%Y.%m.%d.%H.%M.%S", time.gmtime(1.6e9 + i * 7919))]
+        + recorded[i % len(recorded)][1:]
+        for i in range(count)
+    ]
+
+
+def same(old, new):
+    # Le date di partenza sono struct_time, le nuove datetime
+    if isinstance(new, datetime):
+        return tuple(old)[:6] == new.timetuple()[:6]
+    return old == new
+
+
+def main():
+    baseline = BaselineClient()
+    for name in ("GetZone", "GetByWay", "GetLog", "GetNet"):
+        values = leaves(name)
+        for value in values:
+            old, new = baseline._xmlread(None, "k", value)[1], pyialarmmk._decode_value(value)
+            assert same(old, new), (value, old, new)
+        old = measure(lambda: [baseline._xmlread(None, "k", v) for v in values], 500)
+        new = measure(lambda: [pyialarmmk._decode_value(v) for v in values], 500)
+        report(f"{name} ({len(values)} values)", old, new)
+
+    tz = pyialarmmk.panel_timezone({"Type": 19, "Dst": False})
+    rows = log_rows(ROWS)
+    for row in rows:
+        for value in row:
+            assert same(baseline._xmlread(None, "k", value)[1], pyialarmmk._decode_value(value, tz)), value
+        assert pyialarmmk._decode_value(row[0], tz).utcoffset() == timedelta(hours=5, minutes=30)
+    old = measure(lambda: [[baseline._xmlread(None, "k", v) for v in row] for row in rows], 3)
+    new = measure(lambda: [[pyialarmmk._decode_value(v, tz) for v in row] for row in rows], 3)
+    report(f"{ROWS} GetLog rows", old, new, "ms")
+    dates = [row[0] for row in rows]
+    old = measure(lambda: [baseline._xmlread(None, "k", v) for v in dates], 3)
+    new = measure(lambda: [pyialarmmk._decode_value(v, tz) for v in dates], 3)
+    report(f"{ROWS} DTA values", old, new, "ms")
+    parse = [v.partition("|")[2] for v in dates]
+    old = measure(lambda: [time.strptime(v, "%Y.%m.%d.%H.%M.%S") for v in parse], 3)
+    new = measure(lambda: [pyialarmmk._dec_dta("", v) for v in parse], 3)
+    report(f"{ROWS} DTA, parsing only", old, new, "ms")
+
+
+if __name__ == "__main__":
+    main()
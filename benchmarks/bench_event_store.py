@@ -0,0 +1,143 @@
+"""Archivio locale degli eventi: inserimento e interrogazione di 1.000.000 di righe.
+
+Usa IAlarmMkEventStore con i suoi metodi sincroni, quelli eseguiti nell'executor,
+quindi richiede il pacchetto homeassistant ma non un'istanza in esecuzione.
+
+- inserimento a blocchi di FLUSH_SIZE righe per transazione, contro una transazione
+  per riga (misurata su meno righe e riportata per riga);
+- interrogazioni con i filtri del servizio query_events (intervallo di tempo, Cid,
+  zona, utente) sugli indici, contro le stesse su una tabella senza indici;
+- ricerca puntuale di lookup, usata dal logbook per ogni evento.
+"""
+
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+import random
+import sys
+import tempfile
+import time
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT.parent))
+
+from custom_components.ialarm_mk2 import event_store  # noqa: E402
+
+ROWS = 1_000_000
+# Righe scritte una transazione alla volta, per il confronto
+SINGLE_ROWS = 5_000
+QUERIES = 200
+START = datetime(2024, 1, 1, tzinfo=UTC)
+# Un evento ogni 30 secondi circa: 1M righe coprono quasi un anno
+SPAN = timedelta(days=350)
+CIDS = (1401, 3401, 3441, 1131, 1132, 1100, 1570, 3570, 1301, 3301)
+
+
+def rows(count, rng):
+    """Eventi push e voci di GetLog in ordine di tempo, con Cid, zone e utenti casuali."""
+    step = SPAN / count
+    for i in range(count):
+        cid = rng.choice(CIDS)
+        when = START + step * i
+        if i % 3:
+            yield "GetLog", {"Time": when, "Cid": str(cid), "Zone": rng.randint(1, 40), "Area": 1}
+        else:
+            yield "push", {
+                "Name": "iAlarmMK",
+                "Cid": cid,
+                "Status": 1,
+                "LastRealUpdateStatus": when,
+                "Content": "Burglary",
+                "ZoneName": "Garage",
+                "Zone": rng.randint(1, 40),
+            }
+
+
+def open_store(path, indexes=True):
+    store = event_store.IAlarmMkEventStore(None, str(path))
+    store._open()
+    if not indexes:
+        for name in ("events_time", "events_cid_time", "events_zone_time", "events_user_time"):
+            store._conn.execute(f"DROP INDEX {name}")
+    return store
+
+
+def insert(store, count, batch, rng):
+    records = []
+    for source, row in rows(count, rng):
+        records.append(event_store._record(source, row))
+        if len(records) == batch:
+            store._insert(records)
+            records = []
+    if records:
+        store._insert(records)
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def queries(rng):
+    """Filtri del servizio query_events: una settimana casuale, Cid, zona, utente."""
+    result = []
+    for i in range(QUERIES):
+        start = START + timedelta(days=rng.uniform(0, 340))
+        kind = i % 4
+        result.append({
+            "start": start,
+            "end": start + timedelta(days=7),
+            "cid": rng.choice(CIDS) if kind == 1 else None,
+            "zone": rng.randint(1, 40) if kind == 2 else None,
+            "user": rng.randint(1, 40) if kind == 3 else None,
+            "source": None,
+            "limit": event_store.QUERY_LIMIT,
+        })
+    return result
+
+
+def run_queries(store, filters):
+    return [store._query(**f) for f in filters]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        store = open_store(tmp / "events.db")
+        elapsed = timed(insert, store, ROWS, event_store.FLUSH_SIZE, random.Random(17))
+        count = store._conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+        assert count == ROWS, count
+        single = open_store(tmp / "single.db")
+        single_elapsed = timed(insert, single, SINGLE_ROWS, 1, random.Random(17))
+        print(f"{ROWS} rows, {(tmp / 'events.db').stat().st_size / 2**20:.0f} MiB")
+        print(
+            f"{'insert (per row)':<30} old {single_elapsed / SINGLE_ROWS * 1e6:9.1f} us   "
+            f"new {elapsed / ROWS * 1e6:9.1f} us   x{single_elapsed / SINGLE_ROWS / (elapsed / ROWS):.1f}"
+            f"   {ROWS / elapsed:.0f} rows/s"
+        )
+
+        # Stesse righe senza indici, per il confronto delle interrogazioni
+        plain = open_store(tmp / "plain.db", indexes=False)
+        insert(plain, ROWS, event_store.FLUSH_SIZE, random.Random(17))
+        filters = queries(random.Random(5))
+        indexed_results = run_queries(store, filters)
+        assert indexed_results == run_queries(plain, filters)
+        assert all(len(result) == event_store.QUERY_LIMIT for result in indexed_results[::4])
+        old = min(timed(run_queries, plain, filters) for _ in range(3)) / QUERIES
+        new = min(timed(run_queries, store, filters) for _ in range(3)) / QUERIES
+        print(f"{'query (per query)':<30} old {old * 1e3:9.2f} ms   new {new * 1e3:9.2f} ms   x{old / new:.1f}")
+
+        # Ricerca del logbook: un evento a caso tra quelli salvati
+        events = [result[-1] for result in indexed_results]
+        for event in events:
+            data = dict(event["data"], source=event["source"])
+            assert store.lookup(event["source"], data)["data"] == event["data"]
+        lookups = [(event["source"], dict(event["data"])) for event in events]
+        new = min(timed(lambda: [store.lookup(*args) for args in lookups]) for _ in range(5)) / len(lookups)
+        print(f"{'logbook lookup':<30} {'':>16}   new {new * 1e6:9.1f} us")
+        for s in (store, single, plain):
+            s._close()
+
+
+if __name__ == "__main__":
+    main()
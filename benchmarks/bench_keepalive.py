@@ -0,0 +1,73 @@
+"""Soak del keepalive push: migliaia di cicli keepalive e riconnessioni sul loop.
+
+Il client push invia un keepalive ogni KEEPALIVE secondi a una centrale finta
+che risponde a ognuno e chiude la connessione ogni KEEPALIVES_PER_CONNECTION
+risposte. Verifica che il numero di thread del processo resti costante e che
+sul loop non restino keepalive pianificati dalle connessioni chiuse.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+from _common import pyialarmmk
+
+CONNECTIONS = 200
+KEEPALIVES_PER_CONNECTION = 100
+KEEPALIVE = 0.001
+
+
+async def panel(reader, writer):
+    """Risponde ai keepalive e chiude la connessione dopo KEEPALIVES_PER_CONNECTION risposte."""
+    answered = 0
+    try:
+        while answered < KEEPALIVES_PER_CONNECTION:
+            data = await reader.read(4096)
+            if not data:
+                return
+            for _ in range(data.count(b"%maI")):
+                writer.write(b"%maI")
+                answered += 1
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def main():
+    loop = asyncio.get_running_loop()
+    server = await asyncio.start_server(panel, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    threads = threading.active_count()
+    max_threads = threads
+    max_scheduled = 0
+    keepalives = 0
+    started = time.perf_counter()
+    for _ in range(CONNECTIONS):
+        on_con_lost = loop.create_future()
+        push = pyialarmmk.iAlarmMkPushClient(
+            "127.0.0.1", port, "bench", lambda resp: None, loop, on_con_lost, logging.getLogger("benchmarks")
+        )
+        push.keepalive = KEEPALIVE
+        received = []
+        push.register_handler(b"%maI", lambda payload, push=push: (received.append(1), push._handle_keepalive(payload)))
+        await loop.create_connection(lambda: push, "127.0.0.1", port)
+        await on_con_lost
+        keepalives += len(received)
+        # Nessun keepalive della connessione chiusa resta pianificato sul loop
+        assert push._keepalive_handle is None
+        max_threads = max(max_threads, threading.active_count())
+        max_scheduled = max(max_scheduled, len(loop._scheduled))
+    elapsed = time.perf_counter() - started
+    server.close()
+    await server.wait_closed()
+
+    assert keepalives >= CONNECTIONS * KEEPALIVES_PER_CONNECTION, keepalives
+    assert max_threads == threads == threading.active_count(), (threads, max_threads)
+    print(f"{CONNECTIONS} connections, {keepalives} keepalives in {elapsed:.1f} s ({keepalives / elapsed:.0f}/s)")
+    print(f"threads: start {threads}, max {max_threads}, end {threading.active_count()}")
+    print(f"timers scheduled on the loop after each connection: max {max_scheduled}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
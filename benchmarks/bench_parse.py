@@ -0,0 +1,65 @@
+"""Parsing delle risposte: lxml con valori tipizzati contro xmltodict con postprocessor regex.
+
+Parte dal payload cifrato di ogni risposta registrata e arriva agli elementi
+della pagina (comandi lista) o al dict del comando.
+"""
+
+from datetime import datetime
+import time
+
+import xmltodict
+
+from _common import client, load_xml, measure, pyialarmmk, report
+from baseline import BaselineClient
+
+LISTS = ("GetZone", "GetByWay", "GetLog")
+
+
+def old_parse(baseline, payload, xpath, is_list):
+    resp = xmltodict.parse(
+        baseline._xor(payload).decode(),
+        xml_attribs=False,
+        dict_constructor=dict,
+        postprocessor=baseline._xmlread,
+    )
+    if not is_list:
+        return baseline._select(resp, xpath)
+    ln = baseline._select(resp, "%s/Ln" % xpath)
+    return [baseline._select(resp, "%s/L%d" % (xpath, i)) for i in range(ln)]
+
+
+def new_parse(new, payload, xpath, is_list):
+    node = pyialarmmk._find_element(new._parse(new._xor(payload)), xpath)
+    if not is_list:
+        return pyialarmmk._element_to_value(node)
+    return pyialarmmk._list_page(node)[1]
+
+
+def normalize(value):
+    """Date come tuple, per confrontare struct_time e datetime."""
+    if isinstance(value, datetime):
+        return value.timetuple()[:6]
+    if isinstance(value, time.struct_time):
+        return tuple(value)[:6]
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [normalize(item) for item in value]
+    return value
+
+
+def main():
+    baseline, new = BaselineClient(), client()
+    for name in LISTS + ("GetNet",):
+        xpath, is_list = "/Root/Host/%s" % name, name in LISTS
+        payload = bytes(new._xor(load_xml(name)))
+        old_value = old_parse(baseline, payload, xpath, is_list)
+        new_value = new_parse(new, payload, xpath, is_list)
+        assert normalize(old_value) == normalize(new_value), name
+        old = measure(lambda: old_parse(baseline, payload, xpath, is_list), 200)
+        fast = measure(lambda: new_parse(new, payload, xpath, is_list), 200)
+        report(f"{name} ({len(payload)} B)", old, fast)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Stream push: frame consecutivi divisi in chunk di lunghezza casuale.
+
+Verifica che ogni frame venga estratto e consegnato una sola volta, nell'ordine
+di arrivo, qualunque sia la suddivisione dello stream. Misura i frame al secondo
+del solo parser e del client push completo (dispatch per header, XOR, parsing
+XML e decodifica dei valori dell'allarme).
+"""
+
+import asyncio
+import logging
+import random
+import time
+
+from _common import client, load_xml, pyialarmmk
+
+FRAMES = 10_000
+# Frame al secondo richiesti durante una raffica di allarmi
+TARGET = 10_000
+# Lunghezza massima dei chunk: frame spezzati in molti pezzi, segmenti TCP tipici, raffiche coalescenti
+CHUNK_SIZES = (64, 1500, 16384)
+
+
+def stream(count, rng):
+    """Sequenza casuale di keepalive, allarmi cifrati "@alA" e allarmi in chiaro "!lmX"."""
+    alarm = load_xml("Alarm")
+    kinds = (
+        (b"%maI", b""),
+        (b"@alA", b"@alA%04d%04d0000%s%04d" % (len(alarm), 0, client()._xor(alarm), 0)),
+        (b"!lmX", b"!lmX%04d%04d0000%s%04d" % (len(alarm), 0, alarm, 0)),
+    )
+    frames = [rng.choice(kinds) for _ in range(count)]
+    data = b"".join(raw or head for head, raw in frames)
+    return [head for head, _ in frames], data
+
+
+def split(data, rng, max_size):
+    chunks = []
+    pos = 0
+    while pos < len(data):
+        size = rng.randint(1, max_size)
+        chunks.append(data[pos:pos + size])
+        pos += size
+    return chunks
+
+
+def deliver(protocol, chunk):
+    """Consegna un chunk come il transport di asyncio con un BufferedProtocol."""
+    results = []
+    pos = 0
+    while pos < len(chunk):
+        buf = protocol.get_buffer(-1)
+        n = min(len(buf), len(chunk) - pos)
+        buf[:n] = chunk[pos:pos + n]
+        results.append(protocol.buffer_updated(n))
+        pos += n
+    return results
+
+
+def parse(chunks):
+    parser = pyialarmmk.iAlarmMkFrameParser()
+    heads = []
+    for chunk in chunks:
+        for frames in deliver(parser, chunk):
+            heads += [head for head, _, _ in frames]
+    return heads
+
+
+def dispatch(chunks):
+    """Passa i chunk al client push come farebbe il transport, restituisce gli allarmi ricevuti."""
+    loop = asyncio.new_event_loop()
+    alarms = []
+    push = pyialarmmk.iAlarmMkPushClient(
+        "127.0.0.1", 0, "bench", alarms.append, loop, loop.create_future(), logging.getLogger("benchmarks")
+    )
+    try:
+        for chunk in chunks:
+            deliver(push, chunk)
+    finally:
+        push._cancel_keepalive()
+        loop.close()
+    return alarms
+
+
+def throughput(func, chunks, count):
+    best = min(_elapsed(func, chunks) for _ in range(5))
+    return count / best
+
+
+def _elapsed(func, chunks):
+    started = time.perf_counter()
+    func(chunks)
+    return time.perf_counter() - started
+
+
+def main():
+    rng = random.Random(4)
+    heads, data = stream(FRAMES, rng)
+    alarms = len(heads) - heads.count(b"%maI")
+    expected = pyialarmmk._element_to_value(
+        pyialarmmk._find_element(client()._parse(load_xml("Alarm")), "/Root/Host/Alarm")
+    )
+    print(f"{FRAMES} frames, {alarms} alarms, {len(data)} B")
+    for max_size in CHUNK_SIZES:
+        chunks = split(data, rng, max_size)
+        # Ogni frame esattamente una volta e nell'ordine dello stream
+        assert parse(chunks) == heads
+        received = dispatch(chunks)
+        assert len(received) == alarms and all(alarm == expected for alarm in received)
+        parsed = throughput(parse, chunks, FRAMES)
+        dispatched = throughput(dispatch, chunks, FRAMES)
+        result = "ok" if dispatched >= TARGET else "below target"
+        print(
+            f"chunks 1-{max_size:<6} ({len(chunks):6d})   parser {parsed:9.0f} frames/s"
+            f"   push client {dispatched:9.0f} frames/s   {result}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Ricezione dei frame: buffer preallocato del parser contro una copia per ogni lettura.
+
+- client asincrono: iAlarmMkClientProtocol (asyncio.BufferedProtocol) contro
+  StreamReader.readexactly, il percorso di iAlarmMkAsyncClient prima del protocollo.
+  Ogni giro è una risposta, ricevuta e decifrata come nel client.
+- push: get_buffer/recv_into/buffer_updated, come il transport con un BufferedProtocol,
+  contro recv e data_received con copia nel buffer. Raffica di allarmi, senza
+  decodificarli: si misura solo la ricezione.
+- client sincrono: recv_into nel buffer del parser contro recv(1024) e slice del
+  client originale, che non legge frame più lunghi di 1024 byte.
+
+I frame passano da una coppia di socket locali; i tempi includono l'invio, uguale
+per entrambi i percorsi. La memoria è il picco allocato per frame (tracemalloc).
+"""
+
+import asyncio
+import socket
+import time
+import tracemalloc
+
+from _common import client, frame, load_xml, measure, pyialarmmk, report
+
+ROUNDS = 2000
+BURST = 2000
+
+
+def allocated(func, number=1000):
+    """Picco di memoria allocata per chiamata, in byte."""
+    tracemalloc.start()
+    total = 0
+    for _ in range(number):
+        start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        func()
+        total += tracemalloc.get_traced_memory()[1] - start
+    tracemalloc.stop()
+    return total // number
+
+
+async def async_allocated(func, number=1000):
+    tracemalloc.start()
+    total = 0
+    for _ in range(number):
+        start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        await func()
+        total += tracemalloc.get_traced_memory()[1] - start
+    tracemalloc.stop()
+    return total // number
+
+
+async def async_measure(func, number):
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(number):
+            await func()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+async def stream_read_frame(reader, timeout):
+    """Lettura di un frame di iAlarmMkAsyncClient prima di iAlarmMkClientProtocol."""
+    header = await asyncio.wait_for(reader.readexactly(16), timeout)
+    length = int(header[4:8])
+    seq = int(header[8:12])
+    body = await asyncio.wait_for(reader.readexactly(length + 4), timeout)
+    return seq, memoryview(body)[:length]
+
+
+async def bench_async(name, xml, data):
+    loop = asyncio.get_running_loop()
+    xor = client()._xor
+
+    old_sock, old_peer = socket.socketpair()
+    reader, writer = await asyncio.open_connection(sock=old_sock)
+
+    async def old_round():
+        old_peer.send(data)
+        _, payload = await stream_read_frame(reader, 10)
+        return xor(payload)
+
+    new_sock, new_peer = socket.socketpair()
+    new = pyialarmmk.iAlarmMkAsyncClient("127.0.0.1", 0, "bench", "bench", None)
+    new.transport, new._protocol = await loop.create_connection(
+        lambda: pyialarmmk.iAlarmMkClientProtocol(new), sock=new_sock
+    )
+
+    async def new_round():
+        future = new._pending[1] = loop.create_future()
+        new_peer.send(data)
+        return await asyncio.wait_for(future, 10)
+
+    assert await old_round() == xml and await new_round() == xml
+    report(f"async {name} ({len(data)} B)", await async_measure(old_round, ROUNDS), await async_measure(new_round, ROUNDS))
+    print(f"{'':<30} old {await async_allocated(old_round):6d} B/frame    new {await async_allocated(new_round):6d} B/frame")
+    writer.close()
+    new.transport.close()
+    old_peer.close()
+    new_peer.close()
+
+
+def push_client():
+    push = pyialarmmk.iAlarmMkPushClient("127.0.0.1", 0, "bench", lambda resp: None, None, None)
+    push._print = lambda data: None
+    received = []
+    push.register_handler(b"@alA", lambda payload: received.append(len(payload)))
+    return push, received
+
+
+def bench_push(xml):
+    data = b"@alA%04d%04d0000%s%04d" % (len(xml), 0, client()._xor(xml), 0)
+    burst = data * BURST
+    sock, peer = socket.socketpair()
+    sock.setblocking(False)
+    peer.setblocking(False)
+
+    def receive(read):
+        """Invia la raffica e la riceve finché tutti gli allarmi non sono consegnati."""
+        push, received = push_client()
+        sent = 0
+        while len(received) < BURST:
+            try:
+                if sent < len(burst):
+                    sent += peer.send(burst[sent:sent + 65536])
+            except BlockingIOError:
+                pass
+            try:
+                read(push)
+            except BlockingIOError:
+                pass
+        return received
+
+    def old_read(push):
+        push.handle_read(sock.recv(262144))
+
+    def new_read(push):
+        push.buffer_updated(sock.recv_into(push.get_buffer(-1)))
+
+    assert receive(old_read) == receive(new_read) == [len(xml)] * BURST
+    old = measure(lambda: receive(old_read), 3) / BURST
+    new = measure(lambda: receive(new_read), 3) / BURST
+    report(f"push burst ({len(data)} B x {BURST})", old, new)
+
+    # Un allarme alla volta, per la memoria allocata per frame
+    sock.setblocking(True)
+    peer.setblocking(True)
+    old_push, _ = push_client()
+    new_push, _ = push_client()
+    old_round = lambda: (peer.send(data), old_push.handle_read(sock.recv(262144)))
+    new_round = lambda: (peer.send(data), new_push.buffer_updated(sock.recv_into(new_push.get_buffer(-1))))
+    print(f"{'':<30} old {allocated(old_round):6d} B/frame    new {allocated(new_round):6d} B/frame")
+    sock.close()
+    peer.close()
+
+
+def bench_sync(name, xml, data):
+    a, b = socket.socketpair()
+    new = client(a)
+    b.sendall(data)
+    assert new._xor(new._recv_frame()) == xml
+    new_round = lambda: (b.sendall(data), len(new._recv_frame()))
+    fast = measure(new_round, ROUNDS)
+    if len(data) <= 1024:
+        b.sendall(data)
+        assert new._xor(a.recv(1024)[16:-4]) == xml
+        old_round = lambda: (b.sendall(data), a.recv(1024)[16:-4])
+        report(f"sync {name} ({len(data)} B)", measure(old_round, ROUNDS), fast)
+        print(f"{'':<30} old {allocated(old_round):6d} B/frame    new {allocated(new_round):6d} B/frame")
+    else:
+        # Il client originale legge al massimo 1024 byte e tronca il frame
+        print(f"{'sync %s (%d B)' % (name, len(data)):<30} old    n/a        new {fast * 1e6:9.1f} us   {allocated(new_round)} B/frame")
+    new.sock = None
+    a.close()
+    b.close()
+
+
+async def main():
+    for name in ("GetNet", "GetByWay", "GetZone"):
+        xml = load_xml(name)
+        await bench_async(name, xml, frame(xml))
+    bench_push(load_xml("Alarm"))
+    for name in ("GetNet", "GetByWay", "GetZone"):
+        xml = load_xml(name)
+        bench_sync(name, xml, frame(xml))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,24 @@
+"""XOR del payload: operazione su interi contro il ciclo byte per byte."""
+
+from _common import FRAMES, client, measure, report
+from baseline import BaselineClient
+
+
+def main():
+    baseline, new = BaselineClient(), client()
+    data = b"".join(path.read_bytes() for path in sorted(FRAMES.glob("*.xml")))
+    for size in (0, 1, 127, 128, 129, 1000, len(data)):
+        chunk = (data * (size // len(data) + 1))[:size]
+        assert baseline._xor(chunk) == new._xor(chunk)
+        assert new._xor(new._xor(chunk)) == chunk
+    for size in (1024, 16 * 1024, 256 * 1024):
+        chunk = (data * (size // len(data) + 1))[:size]
+        number = max(3, 2_000_000 // size)
+        old = measure(lambda: baseline._xor(chunk), number)
+        fast = measure(lambda: new._xor(chunk), number)
+        report(f"{size // 1024} KiB", old, fast)
+        print(f"{'':<30} old {size / old / 1e6:6.1f} MB/s       new {size / fast / 1e6:6.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
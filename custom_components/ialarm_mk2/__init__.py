@@ -17,12 +17,13 @@ from homeassistant.const import (
 from homeassistant.core import HomeAssistant
 from homeassistant.exceptions import ConfigEntryNotReady
 
-from .const import DOMAIN
+from .const import CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL, DOMAIN
 from .coordinator import iAlarmMk2Coordinator
-from .hub import IAlarmMkHub
+from .hub import IAlarmMkHub, pop_validation
+from .services import async_setup_services, async_unload_services
 
 _LOGGER = logging.getLogger(__name__)
-PLATFORMS: list[Platform] = [Platform.BINARY_SENSOR, Platform.ALARM_CONTROL_PANEL]
+PLATFORMS: list[Platform] = [Platform.BINARY_SENSOR, Platform.ALARM_CONTROL_PANEL, Platform.SENSOR]
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up iAlarm-MK Integration 2 from a config entry."""
@@ -30,11 +31,19 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
     entry.async_on_unload(entry.add_update_listener(async_update_entry))
 
-    hub: IAlarmMkHub = IAlarmMkHub(hass, entry.data[CONF_HOST], entry.data[CONF_PORT], entry.data[CONF_USERNAME], entry.data[CONF_PASSWORD], entry.data[CONF_SCAN_INTERVAL])
+    hub: IAlarmMkHub = IAlarmMkHub(hass, entry.data[CONF_HOST], entry.data[CONF_PORT], entry.data[CONF_USERNAME], entry.data[CONF_PASSWORD], entry.data[CONF_SCAN_INTERVAL], entry.data.get(CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL))
 
     try:
         async with timeout(10):
-            await hub.validate()
+            # Dati appena letti dal config flow: non serve una nuova validazione
+            validated = pop_validation(hass, entry.data)
+            if validated is not None:
+                # Rete e MAC sono appena stati letti: la topologia si rilegge dalla centrale
+                # e sostituisce quella in cache, che può essere di un'altra centrale
+                hub.apply_validation(validated)
+            # Con la topologia in cache non serve contattare la centrale
+            elif not await hub.async_load_topology():
+                await hub.validate()
     except (TimeoutError, ConnectionError) as ex:
         raise ConfigEntryNotReady from ex
 
@@ -45,6 +54,8 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
+    await async_setup_services(hass)
+
     return True
 
 async def async_update_entry(hass: HomeAssistant, entry: ConfigEntry):
@@ -55,7 +66,14 @@ async def async_update_entry(hass: HomeAssistant, entry: ConfigEntry):
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     _LOGGER.info("Unload %s Integration from a config entry...", DOMAIN)
-    return await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if unload_ok:
+        # Chiude subscription push e sessione, altrimenti resterebbero attive dopo un reload
+        coordinator: iAlarmMk2Coordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        await coordinator.async_shutdown()
+        if not hass.data[DOMAIN]:
+            async_unload_services(hass)
+    return unload_ok
 
 async def async_migrate_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Migrate old config entry versions to new versions."""
@@ -67,5 +85,12 @@ async def async_migrate_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
         # Aggiorna la versione a 2 e salva tutto
         hass.config_entries.async_update_entry(entry, data=data, version=2)
+    if entry.version == 2:
+        data = dict(entry.data)
+
+        if CONF_MAX_SCAN_INTERVAL not in data:
+            data[CONF_MAX_SCAN_INTERVAL] = DEFAULT_MAX_SCAN_INTERVAL
+
+        hass.config_entries.async_update_entry(entry, data=data, version=3)
     return True
 
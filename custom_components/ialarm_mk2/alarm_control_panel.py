@@ -75,21 +75,21 @@ class iAlarmMkPanel(
             "lastRealUpdateStatus": self.coordinator.hub.lastRealUpdateStatus
         }
 
-    def alarm_disarm(self, code: str | None = None) -> None:
+    async def async_alarm_disarm(self, code: str | None = None) -> None:
         """Send disarm command."""
-        self.coordinator.hub.ialarmmk.disarm(self._retrive_user_id())
+        await self.coordinator.hub.ialarmmk.async_disarm(self._retrive_user_id())
 
-    def alarm_arm_home(self, code: str | None = None) -> None:
+    async def async_alarm_arm_home(self, code: str | None = None) -> None:
         """Send arm home command."""
-        self.coordinator.hub.ialarmmk.arm_stay(self._retrive_user_id())
+        await self.coordinator.hub.ialarmmk.async_arm_stay(self._retrive_user_id())
 
-    def alarm_arm_away(self, code: str | None = None) -> None:
+    async def async_alarm_arm_away(self, code: str | None = None) -> None:
         """Send arm away command."""
-        self.coordinator.hub.ialarmmk.arm_away(self._retrive_user_id())
+        await self.coordinator.hub.ialarmmk.async_arm_away(self._retrive_user_id())
 
-    def alarm_arm_custom_bypass(self, code: str | None = None) -> None:
+    async def async_alarm_arm_custom_bypass(self, code: str | None = None) -> None:
         """Send arm away command."""
-        self.coordinator.hub.ialarmmk.arm_partial(self._retrive_user_id())
+        await self.coordinator.hub.ialarmmk.async_arm_partial(self._retrive_user_id())
 
     def _retrive_user_id(self) -> str:
         user_id: str = None
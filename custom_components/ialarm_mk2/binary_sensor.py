@@ -7,7 +7,7 @@ from homeassistant.components.binary_sensor import (
     BinarySensorEntity,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import (
@@ -74,22 +74,30 @@ class IAlarmmkSensor(CoordinatorEntity, BinarySensorEntity):
         self._low_battery:bool = None
         self._loss:bool = None
         self._bypass:bool = None
-        self._last_check = None
+        # Stato da scrivere al prossimo aggiornamento del coordinator
+        self._dirty: bool = False
+        self._last_available: bool = None
 
-    def set_attr_is_on(self, state:bool):
-        '''set_attr_is_on.'''
-        self._attr_is_on = state
+    def set_zone(self, is_on:bool, state, low_battery:bool, loss:bool, bypass:bool) -> bool:
+        '''Aggiorna lo stato decodificato della zona, restituisce True se è cambiato.'''
+        new = (is_on, state, low_battery, loss, bypass)
+        if new == (self._attr_is_on, self._attr_state, self._low_battery, self._loss, self._bypass):
+            return False
+        self._attr_is_on, self._attr_state, self._low_battery, self._loss, self._bypass = new
+        self._dirty = True
+        return True
 
-    def set_state(self, state):
-        '''set_state.'''
-        self._attr_state = state
-
-    def set_extra_state_attributes(self,low_battery:bool,loss:bool,bypass:bool,last_check):
-        '''set_extra_state_attributes.'''
-        self._low_battery = low_battery
-        self._loss = loss
-        self._bypass = bypass
-        self._last_check = last_check
+    def update_zone(self, **changes) -> bool:
+        '''Aggiorna solo alcuni campi della zona (es. da un evento push), restituisce True se è cambiata.'''
+        current = {
+            "is_on": self._attr_is_on,
+            "state": self._attr_state,
+            "low_battery": self._low_battery,
+            "loss": self._loss,
+            "bypass": self._bypass,
+        }
+        current.update(changes)
+        return self.set_zone(**current)
 
     @property
     def extra_state_attributes(self):
@@ -98,22 +106,21 @@ class IAlarmmkSensor(CoordinatorEntity, BinarySensorEntity):
             "low_battery": self._low_battery,
             "loss": self._loss,
             "bypass": self._bypass,
-            "last_check": self._last_check,
         }
 
-    '''
     @callback
     def _handle_coordinator_update(self) -> None:
         """Handle updated data from the coordinator."""
-        _LOGGER.info("Handle updated data from the coordinator.")
-        #state = self.coordinator.sensors[self.index].get("state")
-        _LOGGER.info(f"{self.name} {self.index} {self.coordinator.sensors[self.index]}")
-        #self._attr_is_on = self.coordinator.data[self.index].get("state")
-        self.async_write_ha_state()
+        self.async_write_if_changed()
 
-    def update(self) -> None:
-        """Fetch new state data for the sensor."""
-        _LOGGER.info("Fetch new state data for the sensor.")
-        self._attr_is_on = False
-        #await self.coordinator.async_request_refresh()
-    '''
+    @callback
+    def async_write_if_changed(self) -> None:
+        """Scrive lo stato solo se la zona o la disponibilità sono cambiate."""
+        if self.platform is None:
+            # Entità non ancora aggiunta: lo stato sarà scritto all'aggiunta
+            return
+        available = self.available
+        if self._dirty or available != self._last_available:
+            self._dirty = False
+            self._last_available = available
+            self.async_write_ha_state()
@@ -18,8 +18,10 @@ from homeassistant.const import (
 from homeassistant.core import HomeAssistant
 from homeassistant.exceptions import HomeAssistantError
 
-from . import IAlarmMkHub, libpyialarmmk as ipyialarmmk
-from .const import DOMAIN
+from . import libpyialarmmk as ipyialarmmk
+from .const import CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL, DOMAIN
+from .hub import store_validation
+from .libpyialarmmk.pyialarmmk import ConnectionError as PanelConnectionError, LoginError
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -28,7 +30,8 @@ defaults = {
     CONF_PORT: ipyialarmmk.iAlarmMkInterface.IALARMMK_P2P_DEFAULT_PORT,
     CONF_USERNAME: "<CABxxxxxx>",
     CONF_PASSWORD: "<password>",
-    CONF_SCAN_INTERVAL: 60
+    CONF_SCAN_INTERVAL: 60,
+    CONF_MAX_SCAN_INTERVAL: DEFAULT_MAX_SCAN_INTERVAL,
 }
 
 STEP_USER_DATA_SCHEMA = vol.Schema(
@@ -38,21 +41,27 @@ STEP_USER_DATA_SCHEMA = vol.Schema(
                 vol.Required(CONF_USERNAME, default=defaults[CONF_USERNAME]): str,
                 vol.Required(CONF_PASSWORD, default=defaults[CONF_PASSWORD]): str,
                 vol.Required(CONF_SCAN_INTERVAL, default=defaults[CONF_SCAN_INTERVAL]): int,
+                vol.Required(CONF_MAX_SCAN_INTERVAL, default=defaults[CONF_MAX_SCAN_INTERVAL]): int,
             }
         )
 
 async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> dict[str, Any]:
     """Validate the user input allows us to connect."""
 
-    hub = IAlarmMkHub(hass, data[CONF_HOST], data[CONF_PORT], data[CONF_USERNAME], data[CONF_PASSWORD], data[CONF_SCAN_INTERVAL])
+    # Una sola connessione e login: GetNet e GetAlarmStatus nella stessa sessione
+    interface = ipyialarmmk.iAlarmMkInterface(data[CONF_USERNAME], data[CONF_PASSWORD], data[CONF_HOST], data[CONF_PORT], hass, _LOGGER)
 
-    if not await hub.validate():
-        raise InvalidAuth
+    try:
+        net = await interface.async_initialize()
+    except LoginError as e:
+        raise InvalidAuth from e
+    except (PanelConnectionError, ConnectionError, TimeoutError) as e:
+        raise CannotConnect from e
+    finally:
+        await interface.session.close()
 
-    # If you cannot connect:
-    # throw CannotConnect
-    # If the authentication is wrong:
-    # InvalidAuth
+    # Il setup della entry riusa questi dati invece di leggerli di nuovo
+    store_validation(hass, data, {"net": net, "status": interface.get_status()})
 
     # Return info that you want to store in the config entry.
     return {"title": data[CONF_USERNAME]}
@@ -61,7 +70,7 @@ async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> dict[str,
 class ConfigFlow(ConfigFlow, domain=DOMAIN):
     """Handle a config flow for iAlarm-MK Integration 2."""
 
-    VERSION = 2
+    VERSION = 3
 
     async def async_step_user(
         self, user_input: dict[str, Any] | None = None
@@ -105,6 +114,7 @@ class ConfigFlow(ConfigFlow, domain=DOMAIN):
                 vol.Required(CONF_USERNAME, default=defaults[CONF_USERNAME]): str,
                 vol.Required(CONF_PASSWORD, default=defaults[CONF_PASSWORD]): str,
                 vol.Required(CONF_SCAN_INTERVAL, default=defaults[CONF_SCAN_INTERVAL]): int,
+                vol.Required(CONF_MAX_SCAN_INTERVAL, default=defaults[CONF_MAX_SCAN_INTERVAL]): int,
             }
         )
 
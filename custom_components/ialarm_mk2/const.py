@@ -1,3 +1,18 @@
 """Constants for the iAlarm-MK Integration 2 integration."""
 
+from datetime import timedelta
+
 DOMAIN = "ialarm_mk2"
+
+# Intervallo massimo di polling quando il canale push è attivo e lo stato è stabile
+CONF_MAX_SCAN_INTERVAL = "max_scan_interval"
+DEFAULT_MAX_SCAN_INTERVAL = 300
+
+STORAGE_VERSION = 1
+
+# Secondi per cui il risultato della validazione del config flow è riusato dal setup
+VALIDATION_MAX_AGE = 60
+
+# Registri della centrale sincronizzati in modo incrementale
+LOG_COMMANDS = ("GetEvents", "GetLog")
+LOG_SYNC_INTERVAL = timedelta(minutes=5)
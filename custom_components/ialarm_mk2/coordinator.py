@@ -1,21 +1,33 @@
 '''Coordinator.'''
 import asyncio
 from asyncio.timeouts import timeout
-from datetime import datetime, timedelta
+from contextlib import suppress
+from datetime import datetime, time, timedelta
 import logging
-import time
-from zoneinfo import ZoneInfo
 
 from homeassistant.const import STATE_UNAVAILABLE
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
 
 from .binary_sensor import IAlarmmkSensor
-from .const import DOMAIN
+from .const import DOMAIN, LOG_COMMANDS, LOG_SYNC_INTERVAL, STORAGE_VERSION
+from .event_store import IAlarmMkEventStore
 from .hub import IAlarmMkHub
+from .libpyialarmmk import iAlarmMkInterface
+from .libpyialarmmk.pyialarmmk import iAlarmMkLogCursor
 
 _LOGGER = logging.getLogger(__name__)
 
+# Secondi di attesa dopo l'ultimo evento push prima di verificare le zone coinvolte
+ZONE_VERIFY_DELAY = 1
+
+# Stati in cui le zone vanno lette al ritmo più veloce
+FAST_POLL_STATES = (None, iAlarmMkInterface.ALARM_ARMING, iAlarmMkInterface.TRIGGERED, iAlarmMkInterface.UNAVAILABLE)
+
 class iAlarmMk2Coordinator(DataUpdateCoordinator):
     """Class to manage fetching iAlarm-MK data."""
 
@@ -38,6 +50,22 @@ class iAlarmMk2Coordinator(DataUpdateCoordinator):
         self.sensors:IAlarmmkSensor = []
         self.num_read_ok: int = 0
         self.num_read_ko: int = 0
+        # Bitmask delle zone dell'ultima lettura e istante dell'ultima lettura riuscita
+        self._zone_states: list[int | None] | None = None
+        self.last_poll: datetime | None = None
+        self._last_state: int | None = None
+        # Zone da rileggere dopo gli eventi push, con una sola lettura ravvicinata
+        self._zones_to_verify: set[int] = set()
+        self._zone_verifier = Debouncer(
+            hass, _LOGGER, cooldown=ZONE_VERIFY_DELAY, immediate=False, function=self._async_verify_zones
+        )
+        # Cursori di GetLog/GetEvents salvati per centrale
+        self._log_store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.log_cursors.{hub.panel_id}")
+        self._log_cursors: dict[str, iAlarmMkLogCursor] = {}
+        self._log_sync_lock = asyncio.Lock()
+        self._unsub_log_sync = None
+        # Archivio locale di eventi push e registri
+        self.event_store = IAlarmMkEventStore(hass, hass.config.path(f"{DOMAIN}.{hub.panel_id}.db"))
 
 
     async def _async_setup(self):
@@ -45,25 +73,17 @@ class iAlarmMk2Coordinator(DataUpdateCoordinator):
 
         SENSOR_CONFIG = []
         try:
-            # Registrazione listener di spegnimento
-            self.hass.bus.async_listen_once("homeassistant_stop", self.async_shutdown)
-            # Start the subscription in the background
-            if self.hub.ialarmmk.get_threads() < 1:
-                self._subscription_task = asyncio.create_task(self.hub.ialarmmk.subscribe())
-            _LOGGER.debug("Task: %s", self._subscription_task)
-            #await self.hub.ialarmmk.subscribe()
-            #self._subscription_task = asyncio.create_task(self.hub.ialarmmk.subscribe())
-            #asyncio.run(self.hub.ialarmmk.subscribe())
-
-            self.hub.ialarmmk.ialarmmkClient.login()
-            _LOGGER.debug("Login OK.")
-            idsSensors = self.hub.ialarmmk.ialarmmkClient.GetSensor()
-            _LOGGER.debug("Retrieve sensors list OK.")
-            zones = self.hub.ialarmmk.ialarmmkClient.GetZone()
-            #_LOGGER.debug("Retrieve zones list OK. Zones: %s",zones)
-            _LOGGER.debug("Retrieve zones list OK.")
-            self.hub.ialarmmk.ialarmmkClient.logout()
-            _LOGGER.debug("Logout OK.")
+            if self.hub.topology is None:
+                # Dati di rete già letti dalla validazione, servono solo sensori e zone
+                self.hub.topology = await self.hub.async_fetch_topology(self.hub.net)
+                _LOGGER.debug("Retrieve sensors and zones list OK.")
+                await self.hub.topology_cache.async_save(self.hub.topology)
+            else:
+                # Entità create dalla cache, la centrale viene verificata in background
+                _LOGGER.debug("Using cached sensors and zones list.")
+                self.hass.async_create_task(self._async_revalidate_topology())
+            idsSensors = self.hub.topology["sensors"]
+            zones = self.hub.topology["zones"]
 
             for index, id_sensor in enumerate(idsSensors):
                 if id_sensor:
@@ -78,14 +98,71 @@ class iAlarmMk2Coordinator(DataUpdateCoordinator):
 
         except Exception:
                 _LOGGER.exception("Error in setup entities.")
-                self.hub.ialarmmk.ialarmmkClient.logout()
-                _LOGGER.error("Logout OK.")
+                await self.hub.ialarmmk.session.close()
+                _LOGGER.error("Session closed.")
                 raise
 
         for sc in SENSOR_CONFIG:
             iAlarmSensor = IAlarmmkSensor(self, self.hub.device_info, sc["name"], sc["index"], sc["entity_id"], sc["unique_id"], sc["zone_type"])
             self.sensors.append(iAlarmSensor)
 
+        # Sincronizzazione periodica del registro eventi
+        await self.event_store.async_open()
+        stored = await self._log_store.async_load() or {}
+        self._log_cursors = {name: iAlarmMkLogCursor.from_dict(data) for name, data in stored.items()}
+        self._unsub_log_sync = async_track_time_interval(self.hass, self._async_sync_logs, LOG_SYNC_INTERVAL)
+        self.hass.async_create_task(self._async_sync_logs())
+
+        # Listener di spegnimento e subscription push solo a setup riuscito:
+        # un nuovo tentativo dopo ConfigEntryNotReady non lascia supervisori attivi
+        self.hass.bus.async_listen_once("homeassistant_stop", self.async_shutdown)
+        if not self.hub.ialarmmk.is_subscribed():
+            self._subscription_task = asyncio.create_task(self.hub.ialarmmk.subscribe())
+        _LOGGER.debug("Task: %s", self._subscription_task)
+
+    async def _async_revalidate_topology(self) -> None:
+        """Confronta la topologia in cache con la centrale e ricarica l'integrazione se è cambiata."""
+        try:
+            topology = await self.hub.async_fetch_topology()
+        except Exception:
+            _LOGGER.exception("Error revalidating panel topology.")
+            return
+        if topology["fingerprint"] == self.hub.topology["fingerprint"]:
+            _LOGGER.debug("Cached panel topology is up to date.")
+            return
+        _LOGGER.info("Panel topology changed, reloading the integration.")
+        await self.hub.topology_cache.async_save(topology)
+        if self.config_entry is not None:
+            self.hass.config_entries.async_schedule_reload(self.config_entry.entry_id)
+
+    async def _async_sync_logs(self, _now=None) -> None:
+        """Scarica solo le voci nuove di GetLog/GetEvents e le notifica con l'evento ialarm_mk2_log."""
+        if self._log_sync_lock.locked():
+            return
+        async with self._log_sync_lock:
+            changed = False
+            for name in LOG_COMMANDS:
+                cursor = self._log_cursors.get(name)
+                try:
+                    async with self.hub.ialarmmk.session.acquire() as client:
+                        rows, new_cursor = await client.fetch_since(name, cursor)
+                except Exception:
+                    _LOGGER.exception("Error during %s sync.", name)
+                    continue
+                _LOGGER.debug("%s sync: %d new entries.", name, len(rows))
+                self.event_store.async_add(name, rows)
+                # Alla prima sincronizzazione lo storico viene solo marcato come letto
+                if cursor is not None:
+                    for row in reversed(rows):
+                        self.hass.bus.async_fire("ialarm_mk2_log", {"source": name, **_event_data(row)})
+                if new_cursor != cursor:
+                    self._log_cursors[name] = new_cursor
+                    changed = True
+            if changed:
+                await self._log_store.async_save(
+                    {name: cursor.as_dict() for name, cursor in self._log_cursors.items()}
+                )
+
     def callback(self, event_data: dict) -> None:
         """Handle status updates from iAlarm-MK."""
         _LOGGER.debug("Received event from server, data: %s", event_data)
@@ -102,9 +179,12 @@ class iAlarmMk2Coordinator(DataUpdateCoordinator):
 
         # Evento personalizzato con nome "ialarm_mk_event"
         self.hass.bus.async_fire("ialarm_mk2_event", event_data)
+        self.event_store.async_add("push", [{key: value for key, value in event_data.items() if key != "Json"}])
+        self._apply_zone_event(event_data)
 
         # Schedule the update
         self.hass.async_create_task(self.async_update_data())
+        self._async_poll_soon()
 
     def callback_only_status(self, data_in: dict) -> None:
         """Handle status updates from alarm panel."""
@@ -128,6 +208,7 @@ class iAlarmMk2Coordinator(DataUpdateCoordinator):
         '''
         # Schedule the update
         self.hass.async_create_task(self.async_update_data())
+        self._async_poll_soon()
 
 
     async def get_user_name(self, user_id):
@@ -152,35 +233,52 @@ class iAlarmMk2Coordinator(DataUpdateCoordinator):
 
         try:
             async with timeout(30):
-                await self.hass.async_add_executor_job(self._update_data)
+                changed = await self._update_data()
 
+            self._adapt_update_interval(changed)
             await self.async_update_data()
         except Exception as error:
             _LOGGER.exception("Error during fetch data.")
+            self._adapt_update_interval(True)
             raise UpdateFailed(error) from error
 
-    def _update_data(self) -> None:
-        """Fetch data from iAlarm-MK via synchronous functions."""
+    def _adapt_update_interval(self, changed: bool) -> None:
+        """Sceglie il prossimo intervallo di polling in base a stato della centrale e canale push."""
+        ialarmmk = self.hub.ialarmmk
+        floor = timedelta(seconds=self.hub.scan_interval)
+        if changed or self.hub.state in FAST_POLL_STATES or not ialarmmk.push_connected():
+            # Inserimento in corso, allarme o push non attivo: polling al minimo
+            interval = floor
+        else:
+            # Push attivo e stato stabile: l'intervallo raddoppia fino al massimo
+            interval = min(self.update_interval * 2, timedelta(seconds=self.hub.max_scan_interval))
+        if interval != self.update_interval:
+            _LOGGER.debug("Polling interval changed to %s.", interval)
+        self.update_interval = interval
+
+    def _async_poll_soon(self) -> None:
+        """Torna al polling minimo dopo un evento della centrale."""
+        if self.update_interval > timedelta(seconds=self.hub.scan_interval):
+            self.update_interval = timedelta(seconds=self.hub.scan_interval)
+            self.hass.async_create_task(self.async_request_refresh())
+
+    async def _update_data(self) -> bool:
+        """Fetch data from iAlarm-MK, restituisce True se stato o zone sono cambiati."""
+        session = self.hub.ialarmmk.session
         try:
             status: int = self.hub.ialarmmk.get_status()
+            if status in (None, self.hub.ialarmmk.UNAVAILABLE):
+                # Stato non ancora letto (es. avvio dalla topologia in cache)
+                status = await self.hub.ialarmmk.async_get_status()
             _LOGGER.debug("Updating internal state: %s(%s)", self.hub.ialarmmk.status_dict.get(status), status)
             self.hub.state = status
 
-            tz = ZoneInfo(self.hass.config.time_zone)
-            current_time = datetime.now(tz)
             attempts = 0
             max_attempts = 3
 
             while attempts < max_attempts:
                 try:
-                    if self.num_read_ok > 1000:
-                        _LOGGER.debug("Reset connection token.")
-                        self.hub.ialarmmk.ialarmmkClient.logout()
-                        self.num_read_ok = 0
-                        self.num_read_ko = 0
-                    self.hub.ialarmmk.ialarmmkClient.login()
-                    _LOGGER.debug("Login ok.")
-                    status = self.hub.ialarmmk.ialarmmkClient.GetByWay()
+                    status = await session.call("GetByWay")
                     _LOGGER.debug("Retrieve last sensors status.")
                     _LOGGER.debug("Status: %s", status)
                     self.num_read_ok += 1
@@ -188,65 +286,164 @@ class iAlarmMk2Coordinator(DataUpdateCoordinator):
                 except Exception as e:
                     self.num_read_ko += 1
                     _LOGGER.exception("Error during fetch data.")
-                    self.hub.ialarmmk.ialarmmkClient.logout()
-                    _LOGGER.info("After error, logout ok.")
+                    await session.close()
+                    _LOGGER.info("After error, session closed.")
                     attempts += 1
                     if attempts >= max_attempts:
                         _LOGGER.error("Failed after %d attempts", max_attempts)
                         raise UpdateFailed(e) from e
                     _LOGGER.info("Retrying... Attempt %d of %d in 5 seconds.", attempts + 1, max_attempts)
                     _LOGGER.debug("Waiting 5 second before next attempt.")
-                    time.sleep(5)
+                    await asyncio.sleep(5)
                     _LOGGER.debug("Finished waiting, retrying now.")
                 finally:
-                    _LOGGER.debug("Numbers of update ok: %s, ko: %s", self.num_read_ok, self.num_read_ko)
+                    _LOGGER.debug("Numbers of update ok: %s, ko: %s, session: %s", self.num_read_ok, self.num_read_ko, session.stats)
 
             # Inizializza un messaggio di log
             log_message = "\n"
+            previous = self._zone_states
 
             for _idx, sensor in enumerate(self.sensors):
                 sensor: IAlarmmkSensor
                 state: int = status[int(sensor.index)]
 
-                log_message += f"{sensor.name}: state "
-
-                # Verifica se la zona è in uso e in errore
-                if state & self.hub.ialarmmk.ZONE_IN_USE and state & self.hub.ialarmmk.ZONE_FAULT:
-                    sensor.set_attr_is_on(True)
-                    log_message += f"(Aperto) {bin(state)} \n"
-                # Verifica se la zona è solo in uso
-                elif state & self.hub.ialarmmk.ZONE_IN_USE:
-                    sensor.set_attr_is_on(False)
-                    log_message += f"(Chiuso) {bin(state)} \n"
-                # Verifica se la zona non è utilizzata
-                elif state == self.hub.ialarmmk.ZONE_NOT_USED:
-                    sensor.set_attr_is_on(None)
-                    sensor.set_state(STATE_UNAVAILABLE)
-                    log_message += f"(Non Usato) {bin(state)} \n"
-                else:
-                    sensor.set_attr_is_on(None)
-                    _LOGGER.warning("%s: state (Sconosciuto) %s \n", sensor.name, bin(state))
-
-                # Aggiorna gli attributi di stato extra
-                sensor.set_extra_state_attributes(
-                    bool(state & self.hub.ialarmmk.ZONE_LOW_BATTERY),
-                    bool(state & self.hub.ialarmmk.ZONE_LOSS),
-                    bool(state & self.hub.ialarmmk.ZONE_BYPASS),
-                    current_time
-                )
+                # Le zone con la stessa bitmask della lettura precedente non cambiano
+                if previous is not None and previous[int(sensor.index)] == state:
+                    continue
+
+                log_message += f"{sensor.name}: state {self._apply_zone_state(sensor, state)} {bin(state)} \n"
+            changed = previous != list(status) or self._last_state != self.hub.state
+            self._zone_states = list(status)
+            self._last_state = self.hub.state
+            self.last_poll = dt_util.utcnow()
             # Logga il messaggio finale
             _LOGGER.debug(log_message)
+            return changed
 
         except ConnectionError as e:
             _LOGGER.error("Error fetching data: %s", e)
             raise UpdateFailed("Connection error") from e
 
+    def _apply_zone_state(self, sensor: IAlarmmkSensor, state: int) -> str:
+        """Decodifica la bitmask di una zona nel sensore, restituisce la descrizione per il log."""
+        ialarmmk = self.hub.ialarmmk
+        zone_state = None
+        # Verifica se la zona è in uso e in errore
+        if state & ialarmmk.ZONE_IN_USE and state & ialarmmk.ZONE_FAULT:
+            is_on, label = True, "(Aperto)"
+        # Verifica se la zona è solo in uso
+        elif state & ialarmmk.ZONE_IN_USE:
+            is_on, label = False, "(Chiuso)"
+        # Verifica se la zona non è utilizzata
+        elif state == ialarmmk.ZONE_NOT_USED:
+            is_on, label = None, "(Non Usato)"
+            zone_state = STATE_UNAVAILABLE
+        else:
+            is_on, label = None, "(Sconosciuto)"
+            _LOGGER.warning("%s: state (Sconosciuto) %s \n", sensor.name, bin(state))
+
+        # Segna da scrivere solo le entità il cui stato decodificato è cambiato
+        sensor.set_zone(
+            is_on,
+            zone_state,
+            bool(state & ialarmmk.ZONE_LOW_BATTERY),
+            bool(state & ialarmmk.ZONE_LOSS),
+            bool(state & ialarmmk.ZONE_BYPASS),
+        )
+        return label
+
+    def _zone_sensor(self, event_data: dict) -> IAlarmmkSensor | None:
+        """Trova il sensore della zona di un evento push, per nome o per numero di zona."""
+        zone_name = event_data.get("ZoneName")
+        if zone_name:
+            for sensor in self.sensors:
+                if sensor.name == zone_name:
+                    return sensor
+        try:
+            # Le zone dell'evento partono da 1, gli indici di GetByWay da 0
+            index = int(event_data.get("Zone")) - 1
+        except (TypeError, ValueError):
+            return None
+        return next((sensor for sensor in self.sensors if sensor.index == index), None)
+
+    def _apply_zone_event(self, event_data: dict) -> None:
+        """Aggiorna subito la zona di un evento push e ne pianifica la verifica sulla centrale."""
+        try:
+            cid = int(event_data.get("Cid"))
+        except (TypeError, ValueError):
+            return
+        # Gli eventi 4xx (inserimento/disinserimento) hanno l'utente nel campo zona
+        if cid % 1000 // 100 == 4:
+            return
+        sensor = self._zone_sensor(event_data)
+        if sensor is None:
+            return
+        changes = _zone_changes(cid)
+        if changes and sensor.update_zone(**changes):
+            _LOGGER.debug("%s updated from push event %s: %s", sensor.name, cid, changes)
+            sensor.async_write_if_changed()
+            # La bitmask letta in precedenza non descrive più la zona: il prossimo polling
+            # la riscrive anche se la verifica ravvicinata fallisce
+            if self._zone_states is not None and sensor.index < len(self._zone_states):
+                self._zone_states[sensor.index] = None
+        self._zones_to_verify.add(sensor.index)
+        self.hass.async_create_task(self._zone_verifier.async_call())
+
+    async def _async_verify_zones(self) -> None:
+        """Rilegge da GetByWay solo le zone segnalate dagli eventi push."""
+        indexes, self._zones_to_verify = self._zones_to_verify, set()
+        sensors = {sensor.index: sensor for sensor in self.sensors}
+        try:
+            async with self.hub.ialarmmk.session.acquire() as client:
+                for index in sorted(indexes):
+                    state = await client.get_list_item("GetByWay", index)
+                    if state is None or index not in sensors:
+                        continue
+                    label = self._apply_zone_state(sensors[index], state)
+                    _LOGGER.debug("%s verified: %s %s", sensors[index].name, label, bin(state))
+                    if self._zone_states is not None and index < len(self._zone_states):
+                        self._zone_states[index] = state
+                    sensors[index].async_write_if_changed()
+        except Exception:
+            _LOGGER.exception("Error verifying zones %s.", sorted(indexes))
+
     async def async_shutdown(self, *args):
         """Gestisci la chiusura delle risorse quando Home Assistant si spegne."""
         _LOGGER.info("Shutting down iAlarmMk custom component, and close the connections active...")
+        if self._unsub_log_sync:
+            self._unsub_log_sync()
+            self._unsub_log_sync = None
+        self._zone_verifier.async_cancel()
         if self._subscription_task:
             self._subscription_task.cancel()
             self.hub.ialarmmk.cancel_subscription()
-            await self._subscription_task
-        self.hub.ialarmmk.ialarmmkClient.logout()
+            with suppress(asyncio.CancelledError):
+                await self._subscription_task
+            self._subscription_task = None
+        await self.hub.ialarmmk.session.close()
+        await self.event_store.async_close()
         _LOGGER.info("Shutdown iAlarmMk custom component completed.")
+
+
+def _zone_changes(cid: int) -> dict | None:
+    """Effetto di un codice Contact ID sullo stato della zona, None se non è deducibile."""
+    qualifier, event = divmod(cid, 1000)
+    new_event = qualifier == 1
+    # Allarmi 1xx: la zona è aperta, il ripristino è confermato dalla verifica
+    if 100 <= event < 200:
+        return {"is_on": True} if new_event else None
+    if event == 381:
+        return {"loss": new_event}
+    if event == 384:
+        return {"low_battery": new_event}
+    if event == 570:
+        return {"bypass": new_event}
+    return None
+
+
+def _event_data(row: dict) -> dict:
+    """Rende serializzabili in JSON le date di una voce del registro."""
+    return {
+        key: value.isoformat() if isinstance(value, (datetime, time)) else value
+        for key, value in row.items()
+    }
@@ -0,0 +1,262 @@
+"""Archivio locale degli eventi e dei registri della centrale iAlarm-MK."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Mapping
+from datetime import UTC, datetime, time
+import json
+import logging
+import sqlite3
+import threading
+from typing import Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.util import dt as dt_util
+
+_LOGGER = logging.getLogger(__name__)
+
+# Le righe vengono scritte in una sola transazione ogni FLUSH_DELAY secondi
+# o appena ne sono accumulate FLUSH_SIZE
+FLUSH_DELAY = 5
+FLUSH_SIZE = 500
+
+QUERY_LIMIT = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    source TEXT NOT NULL,
+    cid INTEGER,
+    zone INTEGER,
+    user INTEGER,
+    content TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_time ON events (time);
+CREATE INDEX IF NOT EXISTS events_cid_time ON events (cid, time);
+CREATE INDEX IF NOT EXISTS events_zone_time ON events (zone, time);
+CREATE INDEX IF NOT EXISTS events_user_time ON events (user, time);
+"""
+
+_INSERT = "INSERT INTO events (time, source, cid, zone, user, content, data) VALUES (?, ?, ?, ?, ?, ?, ?)"
+_COLUMNS = "SELECT time, source, cid, zone, user, content, data FROM events"
+
+
+class IAlarmMkEventStore:
+    """Archivio append-only in SQLite degli eventi push e delle voci di GetLog/GetEvents.
+
+    Le scritture sono raccolte in memoria e salvate a blocchi nell'executor,
+    le letture non interrogano mai la centrale.
+    """
+
+    def __init__(self, hass: HomeAssistant, path: str) -> None:
+        """Inizializza l'archivio nel file indicato."""
+        self.hass = hass
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        # La connessione è usata dai thread dell'executor, una operazione alla volta
+        self._lock = threading.Lock()
+        self._pending: list[tuple] = []
+        self._unsub_flush: CALLBACK_TYPE | None = None
+        self._flush_task: asyncio.Task | None = None
+
+    async def async_open(self) -> None:
+        """Apre il database creando tabella e indici se mancano."""
+        await self.hass.async_add_executor_job(self._open)
+
+    def _open(self) -> None:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        self._conn = conn
+
+    async def async_close(self) -> None:
+        """Salva le righe in sospeso e chiude il database."""
+        if self._flush_task is not None:
+            await self._flush_task
+        await self.async_flush()
+        if self._conn is not None:
+            await self.hass.async_add_executor_job(self._close)
+
+    def _close(self) -> None:
+        # Attende l'eventuale scrittura o lettura in corso nell'executor
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @callback
+    def async_add(self, source: str, rows: list[dict[str, Any]]) -> None:
+        """Accoda le righe da salvare, la scrittura avviene a blocchi."""
+        self._pending.extend(_record(source, row) for row in rows)
+        if len(self._pending) >= FLUSH_SIZE:
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = self.hass.async_create_task(self._async_flush_all())
+        elif self._pending and self._unsub_flush is None:
+            self._unsub_flush = async_call_later(self.hass, FLUSH_DELAY, self._async_flush_later)
+
+    async def _async_flush_all(self) -> None:
+        # Anche le righe arrivate durante la scrittura, come durante il primo download dello storico
+        while self._pending and self._conn is not None:
+            await self.async_flush()
+
+    async def _async_flush_later(self, _now) -> None:
+        self._unsub_flush = None
+        await self.async_flush()
+
+    async def async_flush(self) -> None:
+        """Scrive in una sola transazione le righe accodate."""
+        if self._unsub_flush is not None:
+            self._unsub_flush()
+            self._unsub_flush = None
+        if not self._pending or self._conn is None:
+            return
+        records, self._pending = self._pending, []
+        try:
+            await self.hass.async_add_executor_job(self._insert, records)
+        except sqlite3.Error:
+            _LOGGER.exception("Error saving %d events.", len(records))
+
+    def _insert(self, records: list[tuple]) -> None:
+        with self._lock:
+            if self._conn is None:
+                return
+            with self._conn:
+                self._conn.executemany(_INSERT, records)
+
+    async def async_query(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        cid: int | None = None,
+        zone: int | None = None,
+        user: int | None = None,
+        source: str | None = None,
+        limit: int = QUERY_LIMIT,
+    ) -> list[dict[str, Any]]:
+        """Restituisce le righe più recenti che soddisfano i filtri, dalla più recente."""
+        await self.async_flush()
+        if self._conn is None:
+            return []
+        return await self.hass.async_add_executor_job(
+            self._query, start, end, cid, zone, user, source, limit
+        )
+
+    def _query(self, start, end, cid, zone, user, source, limit) -> list[dict[str, Any]]:
+        where = []
+        params: list[Any] = []
+        for column, value in (("cid", cid), ("zone", zone), ("user", user), ("source", source)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if start is not None:
+            where.append("time >= ?")
+            params.append(start.timestamp())
+        if end is not None:
+            where.append("time < ?")
+            params.append(end.timestamp())
+        sql = _COLUMNS
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY time DESC, id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            if self._conn is None:
+                return []
+            rows = self._conn.execute(sql, params).fetchall()
+        return [_row_dict(row) for row in rows]
+
+    def lookup(self, source: str, data: Mapping[str, Any]) -> dict[str, Any] | None:
+        """Restituisce la riga salvata per i dati di un evento del bus, o None.
+
+        Ricerca puntuale sull'indice della data, per il logbook: se è in corso una
+        scrittura non la attende e restituisce None.
+        """
+        row = {key: _iso_datetime(value) for key, value in data.items()}
+        when = _row_time(row)
+        if when is None:
+            return None
+        timestamp = when.timestamp()
+        cid = _int(row.get("Cid"))
+        for record in reversed(self._pending):
+            if record[:3] == (timestamp, source, cid):
+                return _row_dict(record)
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            if self._conn is None:
+                return None
+            record = self._conn.execute(
+                f"{_COLUMNS} WHERE time BETWEEN ? AND ? AND source = ? AND cid IS ? ORDER BY id DESC LIMIT 1",
+                (timestamp - 0.001, timestamp + 0.001, source, cid),
+            ).fetchone()
+        finally:
+            self._lock.release()
+        return _row_dict(record) if record is not None else None
+
+
+def _row_dict(row: tuple) -> dict[str, Any]:
+    return {
+        "time": datetime.fromtimestamp(row[0], UTC).isoformat(),
+        "source": row[1],
+        "cid": row[2],
+        "zone": row[3],
+        "user": row[4],
+        "content": row[5],
+        "data": json.loads(row[6]),
+    }
+
+
+def _row_time(row: Mapping[str, Any]) -> datetime | None:
+    """Data in UTC di un evento o di una voce del registro: il primo valore datetime.
+
+    Una data senza fuso (fuso della centrale non riconosciuto) è considerata in UTC,
+    come nei cursori del registro.
+    """
+    when = next((value for value in row.values() if isinstance(value, datetime)), None)
+    return dt_util.as_utc(when) if when is not None else None
+
+
+def _iso_datetime(value: Any) -> Any:
+    """Le date negli eventi letti dal recorder sono stringhe isoformat, da riconvertire."""
+    if isinstance(value, str) and len(value) >= 19 and value[10] == "T":
+        return dt_util.parse_datetime(value) or value
+    return value
+
+
+def _record(source: str, row: dict[str, Any]) -> tuple:
+    """Converte un evento o una voce del registro nella tupla da inserire."""
+    when = _row_time(row) or dt_util.utcnow()
+    cid = _int(row.get("Cid"))
+    zone = _int(row.get("Zone"))
+    user = _int(row.get("User"))
+    # Nel Contact ID gli eventi 4xx (inserimento/disinserimento) riportano l'utente nel campo zona
+    if user is None and cid is not None and cid % 1000 // 100 == 4:
+        user = zone
+    content = row.get("Content")
+    return (
+        when.timestamp(),
+        source,
+        cid,
+        zone,
+        user,
+        str(content) if content is not None else None,
+        json.dumps(row, default=_json_default),
+    )
+
+
+def _int(value: Any) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, time)):
+        return value.isoformat()
+    return str(value)
@@ -1,19 +1,50 @@
 '''Hub per utilizzo liberia.'''
 import logging
+import time
+from typing import Any
 
+from homeassistant.const import CONF_HOST, CONF_PASSWORD, CONF_PORT, CONF_USERNAME
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers import device_registry as dr
 from homeassistant.helpers.device_registry import format_mac
 from homeassistant.helpers.entity import DeviceInfo
 
 from . import libpyialarmmk as ipyialarmmk
+from .const import DEFAULT_MAX_SCAN_INTERVAL, VALIDATION_MAX_AGE
+from .topology import IAlarmMkTopologyCache, build_topology
 
 _LOGGER = logging.getLogger(__name__)
 
+# Risultati della validazione del config flow, riusati dal setup della entry
+VALIDATION_DATA = "ialarm_mk2_validation"
+
+
+def _validation_key(data: dict[str, Any]) -> tuple:
+    return (data[CONF_HOST], data[CONF_PORT], data[CONF_USERNAME], data[CONF_PASSWORD])
+
+
+def storage_id(value: str) -> str:
+    """Identificativo della centrale per nomi di file e chiavi di Store: solo lettere e cifre."""
+    return "".join(char for char in value if char.isalnum()).lower()
+
+
+def store_validation(hass: HomeAssistant, data: dict[str, Any], result: dict[str, Any]) -> None:
+    """Conserva dati di rete e stato letti durante la validazione delle credenziali."""
+    hass.data.setdefault(VALIDATION_DATA, {})[_validation_key(data)] = (time.monotonic(), result)
+
+
+def pop_validation(hass: HomeAssistant, data: dict[str, Any]) -> dict[str, Any] | None:
+    """Restituisce, una sola volta, il risultato recente della validazione per queste credenziali."""
+    stored = hass.data.get(VALIDATION_DATA, {}).pop(_validation_key(data), None)
+    if stored is None or time.monotonic() - stored[0] > VALIDATION_MAX_AGE:
+        return None
+    return stored[1]
+
+
 class IAlarmMkHub:
     """Gestisce la connessione con iAlarm-MK."""
 
-    def __init__(self, hass: HomeAssistant, host: str, port: int, username: str, password: str, scan_interval: int) -> None:
+    def __init__(self, hass: HomeAssistant, host: str, port: int, username: str, password: str, scan_interval: int, max_scan_interval: int = DEFAULT_MAX_SCAN_INTERVAL) -> None:
         """Inizializza la connessione con iAlarm-MK."""
         _LOGGER.info("Initializing iAlarmMkHub")
         self.hass: HomeAssistant = hass
@@ -22,13 +53,65 @@ class IAlarmMkHub:
         self.username: str = username
         self.password: str = password
         self.scan_interval: int = scan_interval
+        self.max_scan_interval: int = max(max_scan_interval, scan_interval)
         self.mac: str = None
+        self.net: dict = None
         self.name: str = None
         self.state: int = None
         self.changed_by: str = None
         self.lastRealUpdateStatus = None
         self.ialarmmk = ipyialarmmk.iAlarmMkInterface(self.username, self.password, self.host, self.port, self.hass, _LOGGER)
         self.device_info = None
+        # Rete, sensori e zone della centrale, letti dalla cache o dalla centrale
+        self.topology: dict = None
+        self.topology_from_cache: bool = False
+        self.topology_cache = IAlarmMkTopologyCache(hass, storage_id(username))
+
+    async def async_load_topology(self) -> bool:
+        """Carica la topologia dalla cache su disco, senza contattare la centrale.
+
+        Se il MAC è già noto, una topologia salvata per un'altra centrale viene scartata.
+        """
+        topology = await self.topology_cache.async_load(self.mac)
+        if topology is None:
+            return False
+        self.topology = topology
+        self.topology_from_cache = True
+        self._set_device(topology["net"])
+        _LOGGER.info("Panel topology loaded from cache, MAC address: %s", self.mac)
+        return True
+
+    def apply_validation(self, result: dict[str, Any]) -> None:
+        """Usa dati di rete e stato già letti dal config flow, senza contattare la centrale."""
+        self._set_device(result["net"])
+        self.ialarmmk.status = result["status"]
+        self.state = result["status"]
+        _LOGGER.info("Using config flow validation, MAC address: %s", self.mac)
+
+    async def async_fetch_topology(self, net: dict | None = None) -> dict:
+        """Legge rete (se non indicata), sensori e zone dalla centrale con una sola sessione."""
+        async with self.ialarmmk.session.acquire() as client:
+            if net is None:
+                net = await client.GetNet()
+            sensors = await client.GetSensor()
+            zones = await client.GetZone()
+        return build_topology(net or {}, sensors or [], zones or [])
+
+    def _set_device(self, net: dict) -> None:
+        """Imposta MAC, nome e informazioni sul dispositivo."""
+        self.net = net
+        self.mac = format_mac(net.get("Mac"))
+        self.name = net.get("Name")
+        self.device_info = DeviceInfo(
+            manufacturer="antifurto 365",
+            name=self.name,
+            connections={(dr.CONNECTION_NETWORK_MAC, self.mac)}
+        )
+
+    @property
+    def panel_id(self) -> str:
+        """Identificativo della centrale per i dati salvati su disco: MAC senza separatori."""
+        return storage_id(self.mac or self.host)
 
     async def validate(self) -> bool:
         """Verifica la connessione e recupera le informazioni sul dispositivo."""
@@ -37,18 +120,10 @@ class IAlarmMkHub:
         try:
             # Verifica se l'indirizzo MAC è già stato recuperato
             if self.mac is None:
-                # Recupera l'indirizzo MAC e imposta le informazioni sul dispositivo
-                data_in:dict = self.ialarmmk.get_mac()
-                self.mac = format_mac(data_in.get("Mac"))
-                self.name = data_in.get("Name")
+                # Recupera stato e indirizzo MAC e imposta le informazioni sul dispositivo
+                data_in:dict = await self.ialarmmk.async_initialize()
+                self._set_device(data_in)
                 _LOGGER.info("MAC address: %s", self.mac)
-
-                # Imposta le informazioni sul dispositivo
-                self.device_info = DeviceInfo(
-                    manufacturer="antifurto 365",
-                    name=self.name,
-                    connections={(dr.CONNECTION_NETWORK_MAC, self.mac)}
-                )
         except Exception as e:
             _LOGGER.error("Failed to validate connection or get MAC address: %s", e)
             return False  # Restituisce False in caso di errore
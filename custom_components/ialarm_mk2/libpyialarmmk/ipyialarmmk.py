@@ -15,12 +15,13 @@
 import asyncio
 from datetime import datetime
 import json
-import threading
+import random
+import time
 from zoneinfo import ZoneInfo
 
 from homeassistant.core import HomeAssistant
 
-from .pyialarmmk import iAlarmMkClient, iAlarmMkPushClient
+from .pyialarmmk import iAlarmMkAsyncClient, iAlarmMkPushClient, iAlarmMkSession
 
 
 class iAlarmMkInterface:
@@ -57,6 +58,19 @@ class iAlarmMkInterface:
     IALARMMK_P2P_DEFAULT_PORT = 18034
     IALARMMK_P2P_DEFAULT_HOST = "47.91.74.102"
 
+    # Stati della connessione push
+    PUSH_STOPPED = "stopped"
+    PUSH_CONNECTING = "connecting"
+    PUSH_CONNECTED = "connected"
+    PUSH_BACKOFF = "backoff"
+
+    # Secondi concessi alla risposta del keepalive prima di dichiarare morta la connessione
+    PUSH_KEEPALIVE_GRACE = 15
+    # Backoff di riconnessione e durata oltre cui una connessione è considerata stabile
+    PUSH_BACKOFF_BASE = 1
+    PUSH_BACKOFF_MAX = 300
+    PUSH_STABLE_AFTER = 60
+
     def __init__(
         self,
         uid: str,
@@ -65,16 +79,19 @@ class iAlarmMkInterface:
         port: int,
         hass: HomeAssistant = None,
         logger = None,
+        session_idle_timeout: int = 300,
+        multiplex: bool = False,
     ):
-        '''Impostazione.'''
-        self.threadID = "iAlarmMK2-ThreadID"
+        '''Impostazione, senza accedere alla rete: stato e MAC si leggono con async_initialize.'''
         self.host = host
         self.port = port
         self.uid = uid
         self.pwd = pwd
         self.logger = logger
 
-        self.ialarmmkClient = iAlarmMkClient(self.host, self.port, self.uid, self.pwd, self.logger)
+        self.ialarmmkAsyncClient = iAlarmMkAsyncClient(self.host, self.port, self.uid, self.pwd, self.logger, multiplex)
+        # Sessione autenticata condivisa tra polling e comandi
+        self.session = iAlarmMkSession(self.ialarmmkAsyncClient, idle_timeout=session_idle_timeout, logger=self.logger)
         self.status = None
         self.callback = None
         self.callback_only_status = None
@@ -83,45 +100,69 @@ class iAlarmMkInterface:
         self.client = None
         self.transport = None
         self._cancelled = False
-
-        self._get_status()
+        self.subscribed = False
+        self.push_state = self.PUSH_STOPPED
+        self.push_connect_count = 0
+        self.push_disconnect_count = 0
+        self.push_connected_time = 0.0
+        self.push_last_error = None
+        # Istante dell'ultimo frame ricevuto, conservato anche dopo la chiusura della connessione
+        self.push_last_frame = None
+        self._push_connected_at = None
+        self._push_listeners = []
+
+    @classmethod
+    async def create(cls, *args, **kwargs):
+        '''Crea l'interfaccia e ne legge stato e MAC dalla centrale.'''
+        interface = cls(*args, **kwargs)
+        await interface.async_initialize()
+        return interface
+
+    async def async_initialize(self) -> dict:
+        '''Legge in parallelo stato dell'allarme e dati di rete, restituisce questi ultimi.'''
+        _, network_info = await asyncio.gather(self.async_get_status(), self.async_get_mac())
+        return network_info
 
     def set_callback(self, callback, callback_only_status):
         '''set_callback.'''
         self.callback = callback
         self.callback_only_status = callback_only_status
 
-    def get_threads(self) -> int:
-        '''Recupera il numero di threads attivi.'''
-        threads = threading.enumerate()
-        specific_threads = [t for t in threads if t.name.startswith(self.threadID)]
-        for thread in specific_threads:
-            self.logger.debug(f"Active thread: {thread.name}")  # noqa: G004
-        return len(specific_threads)
-
-    async def subscribe(self):
-        '''Funzione migliorata.'''
-        disconnect_time = 60 * 5
-
-        while True:
-            # Controlla se il task è stato cancellato prima di eseguire altre operazioni
-            if self._cancelled:
-                self.logger.info("Subscription task cancellato.")
-                break
+    def add_push_listener(self, listener):
+        '''Registra una funzione chiamata a ogni cambio di stato della connessione push.
 
-            num_treads = self.get_threads()
-            self.logger.debug(f"Numbers of threads for '{self.threadID}': {num_treads}")  # noqa: G004
-            loop = asyncio.get_running_loop()
-            on_con_lost = loop.create_future()
+        Restituisce la funzione che la rimuove.
+        '''
+        self._push_listeners.append(listener)
+        return lambda: self._push_listeners.remove(listener)
 
+    def _set_push_state(self, state):
+        self.push_state = state
+        for listener in list(self._push_listeners):
             try:
-                # Se non esiste un client o il trasporto è chiuso, crea una nuova connessione
-                if self.client is None or self.transport is None or self.transport.is_closing():
-                    if self.transport:
-                        self.logger.debug("Closing existing transport.")
-                        self.transport.close()
-                        self.transport = None  # Resetta il trasporto
+                listener()
+            except Exception:
+                self.logger.exception("Error in push state listener.")
+
+    def is_subscribed(self) -> bool:
+        '''True se il ciclo di subscribe() è in esecuzione.'''
+        return self.subscribed
 
+    async def subscribe(self):
+        '''Supervisore della connessione push.
+
+        Si riconnette appena la connessione cade (on_con_lost) o quando una risposta
+        al keepalive tarda, con backoff esponenziale e jitter fino a PUSH_BACKOFF_MAX.
+        '''
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        self.subscribed = True
+        try:
+            while not self._cancelled:
+                on_con_lost = loop.create_future()
+                self._set_push_state(self.PUSH_CONNECTING)
+                await self._async_load_timezone()
+                try:
                     self.client = iAlarmMkPushClient(
                         self.host,
                         self.port,
@@ -129,50 +170,126 @@ class iAlarmMkInterface:
                         self.set_status,
                         loop,
                         on_con_lost,
-                        self.threadID,
                         self.logger,
+                        self.ialarmmkAsyncClient,
                     )
-                    self.transport, protocol = await loop.create_connection(
-                        lambda: self.client,
-                        self.host,
-                        self.port,
+                    self.transport, _ = await asyncio.wait_for(
+                        loop.create_connection(lambda: self.client, self.host, self.port),
+                        self.client.timeout,
                     )
+                except (OSError, TimeoutError) as e:
+                    self.logger.error("Push connection failed: %s", e)
+                    self.push_last_error = str(e) or type(e).__name__
+                else:
+                    connected_at = time.monotonic()
+                    self._push_connected_at = connected_at
+                    self.push_connect_count += 1
+                    self._set_push_state(self.PUSH_CONNECTED)
                     self.logger.info("Connected to the server.")
+                    try:
+                        reason = await self._watch_push(on_con_lost)
+                    except Exception as e:
+                        self.logger.exception("Unexpected error in push connection.")
+                        reason = str(e) or type(e).__name__
+                    finally:
+                        self.push_connected_time += time.monotonic() - connected_at
+                        self._push_connected_at = None
+                        self.push_disconnect_count += 1
+                        self._close_push()
+                    self.logger.warning("Push connection closed: %s", reason)
+                    self.push_last_error = reason
+                    # Una connessione rimasta stabile azzera il backoff
+                    if time.monotonic() - connected_at > self.PUSH_STABLE_AFTER:
+                        attempt = 0
+
+                if self._cancelled:
+                    break
+                delay = self._push_backoff(attempt)
+                # Oltre 2**10 volte la base il ritardo è comunque limitato da PUSH_BACKOFF_MAX
+                attempt = min(attempt + 1, 10)
+                self._set_push_state(self.PUSH_BACKOFF)
+                self.logger.debug("Push reconnect in %.1f s (attempt %d).", delay, attempt)
+                await asyncio.sleep(delay)
+        finally:
+            self.subscribed = False
+            # Nessun keepalive o connessione push sopravvive alla subscription
+            self._close_push()
+            self._set_push_state(self.PUSH_STOPPED)
+
+    async def _async_load_timezone(self):
+        '''Legge il fuso della centrale, se manca, prima che arrivino allarmi push con date.'''
+        if not self.ialarmmkAsyncClient.needs_timezone():
+            return
+        try:
+            await self.session.call("GetTime")
+        except Exception as e:
+            self.logger.warning("Unable to read the panel time zone: %s", e)
 
-                # Mantieni la connessione per `disconnect_time`
-                await asyncio.sleep(disconnect_time)
-
-            except (ConnectionError, TimeoutError) as e:
-                self.logger.error(f"Connection error: {e}")
+    async def _watch_push(self, on_con_lost) -> str:
+        '''Attende la caduta della connessione o il ritardo di una risposta al keepalive.'''
+        deadline_after = iAlarmMkPushClient.keepalive + self.PUSH_KEEPALIVE_GRACE
+        while True:
+            last_frame = self.client.last_frame or self._push_connected_at
+            remaining = last_frame + deadline_after - time.monotonic()
+            if remaining <= 0:
+                return "keepalive timeout"
+            try:
+                await asyncio.wait_for(asyncio.shield(on_con_lost), remaining)
+            except TimeoutError:
+                # Nel frattempo può essere arrivato un frame: ricalcola la scadenza
+                continue
+            return "connection lost"
+
+    def _push_backoff(self, attempt: int) -> float:
+        '''Ritardo di riconnessione: esponenziale con tetto, metà fissa e metà casuale.'''
+        delay = min(self.PUSH_BACKOFF_MAX, self.PUSH_BACKOFF_BASE * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _close_push(self):
+        self.push_last_frame = self._last_frame()
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.close()
+        self.client = None
+        self.transport = None
 
-            except Exception as e:
-                self.logger.error(f"Unexpected error: {e}")
+    @property
+    def push_stats(self) -> dict:
+        '''Statistiche della connessione push.'''
+        now = time.monotonic()
+        connected_time = self.push_connected_time
+        if self._push_connected_at is not None:
+            connected_time += now - self._push_connected_at
+        last_frame = self._last_frame()
+        return {
+            "state": self.push_state,
+            "connects": self.push_connect_count,
+            "disconnects": self.push_disconnect_count,
+            "connected_time": round(connected_time),
+            "last_frame_age": round(now - last_frame, 1) if last_frame is not None else None,
+            "last_error": self.push_last_error,
+        }
 
-            finally:
-                # Chiudi il trasporto se il client segnala che la connessione è terminata
-                if on_con_lost.done():
-                    self.logger.info("Connection lost. Cleaning up...")
-                    if self.transport and not self.transport.is_closing():
-                        self.transport.close()
-                    self.client = None  # Resetta il client
-                    self.transport = None  # Resetta il trasporto
+    def _last_frame(self):
+        if self.client is not None and self.client.last_frame is not None:
+            return self.client.last_frame
+        return self.push_last_frame
 
-                # Attendi prima di riconnetterti
-                await asyncio.sleep(1)
+    def push_connected(self) -> bool:
+        '''True se il canale push è connesso: il watchdog lo chiude se i keepalive non hanno risposta.'''
+        return self.push_state == self.PUSH_CONNECTED
 
     def cancel_subscription(self):
         '''Metodo per cancellare la subscription.'''
         self._cancelled = True  # Imposta il flag di cancellazione
 
-    def _get_status(self):
+    async def async_get_status(self):
         self.logger.debug("Retrieving DevStatus...")
         try:
-            self.ialarmmkClient.login()
-            self.status = self.ialarmmkClient.GetAlarmStatus().get("DevStatus")
+            self.status = (await self.session.call("GetAlarmStatus")).get("DevStatus")
             self.logger.debug("DevStatus: %s(%s)", self.status_dict.get(self.status),self.status)
-            self.ialarmmkClient.logout()
         except Exception:
             self.status = self.UNAVAILABLE
+        return self.status
 
     def get_status(self):
         return self.status
@@ -209,7 +326,7 @@ class iAlarmMkInterface:
             "ZoneName": data_event_received.get("ZoneName"),
             "Zone": data_event_received.get("Zone"),
             "Err": data_event_received.get("Err"),
-            "Json": json.dumps(data_event_received)
+            "Json": json.dumps(data_event_received, default=str)
         }
 
         # Invoca il callback se definito
@@ -219,64 +336,44 @@ class iAlarmMkInterface:
         else:
             self.logger.debug("Callback is None")
 
-    def cancel_alarm(self) -> None:
+    async def async_cancel_alarm(self) -> None:
         try:
-            self.ialarmmkClient.login()
-            self.ialarmmkClient.SetAlarmStatus(3)
-            self._set_status(self.DISARMED)
-            self.ialarmmkClient.logout()
+            await self.session.call("SetAlarmStatus", 3)
+            await self.async_set_status(self.DISARMED, None)
         except Exception as e:
             self.logger.error("Error canceling alarm: %s", e)
 
-    def arm_stay(self, user_id: str | None) -> None:
+    async def async_arm_stay(self, user_id: str | None) -> None:
         try:
-            self.ialarmmkClient.login()
-            self.ialarmmkClient.SetAlarmStatus(2)
-            self._set_status(self.ARMED_STAY, user_id)
-            self.ialarmmkClient.logout()
+            await self.session.call("SetAlarmStatus", 2)
+            await self.async_set_status(self.ARMED_STAY, user_id)
         except Exception as e:
             self.logger.error("Error arming alarm in stay mode: %s", e)
 
-    def disarm(self, user_id: str | None) -> None:
+    async def async_disarm(self, user_id: str | None) -> None:
         try:
-            self.ialarmmkClient.login()
-            self.ialarmmkClient.SetAlarmStatus(1)
-            self._set_status(self.DISARMED, user_id)
-            self.ialarmmkClient.logout()
+            await self.session.call("SetAlarmStatus", 1)
+            await self.async_set_status(self.DISARMED, user_id)
         except Exception as e:
             self.logger.error("Error disarming alarm: %s", e)
 
-    def arm_away(self, user_id: str | None) -> None:
+    async def async_arm_away(self, user_id: str | None) -> None:
         try:
-            self.ialarmmkClient.login()
-            self.ialarmmkClient.SetAlarmStatus(0)
-            self._set_status(self.ALARM_ARMING, user_id)
-            self.ialarmmkClient.logout()
+            await self.session.call("SetAlarmStatus", 0)
+            await self.async_set_status(self.ALARM_ARMING, user_id)
         except Exception as e:
             self.logger.error("Error arming alarm in away mode: %s", e)
 
-    def arm_partial(self, user_id: str | None) -> None:
+    async def async_arm_partial(self, user_id: str | None) -> None:
         try:
-            self.ialarmmkClient.login()
-            self.ialarmmkClient.SetAlarmStatus(8)
-            self._set_status(self.ARMED_PARTIAL, user_id)
-            self.ialarmmkClient.logout()
+            await self.session.call("SetAlarmStatus", 8)
+            await self.async_set_status(self.ARMED_PARTIAL, user_id)
         except Exception as e:
             self.logger.error("Error arming alarm in partial mode: %s", e)
 
-    def _set_status(self, status, user_id: str | None) -> None:
-        if self.hass is not None:
-            try:
-                result = asyncio.run_coroutine_threadsafe(
-                    self.async_set_status(status, user_id), self.hass.loop
-                ).result()
-                # Puoi anche loggare il risultato se necessario
-                self.logger.debug("Status updated successfully: %s", status)
-            except Exception as e:
-                # Gestisci l'eccezione e logga l'errore
-                self.logger.error("Error updating status: %s", e)
-
     async def async_set_status(self, status, user_id: str | None) -> None:
+        if self.hass is None or self.callback_only_status is None:
+            return
         tz = ZoneInfo(self.hass.config.time_zone)
         current_time = datetime.now(tz)
         data = {
@@ -286,10 +383,9 @@ class iAlarmMkInterface:
         }
         self.callback_only_status(data)
 
-    def get_mac(self) -> dict:
-        self.ialarmmkClient.login()
-        network_info = self.ialarmmkClient.GetNet()
-        self.ialarmmkClient.logout()
+    async def async_get_mac(self) -> dict:
+        network_info = await self.session.call("GetNet")
+        mac = None
         if network_info is not None:
             mac = network_info.get("Mac", "")
             name = network_info.get("Name", "iAlarm-MK")
@@ -15,16 +15,18 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 import asyncio
-from collections import OrderedDict as OD
-import random
-import re
+from collections import OrderedDict as OD, deque
+from contextlib import aclosing, asynccontextmanager
+from datetime import datetime, time as dtime, timedelta, timezone
+from functools import lru_cache
+import hashlib
+import inspect
 import socket
-import threading
 import time
 import uuid
+from xml.sax.saxutils import escape
 
 from lxml import etree
-import xmltodict
 
 
 class ConnectionError(Exception):
@@ -51,9 +53,21 @@ class iAlarmMkClient:
 
     seq = 0
     timeout = 10
+    # Fuso della centrale, letto da GetTime alla prima richiesta che restituisce date
+    tzinfo = None
+    # Se GetTime non restituisce un fuso riconosciuto, lo si richiede solo dopo questi secondi
+    TZ_RETRY_INTERVAL = 3600
+    _tz_failed_at = None
+    HEADER_SIZE = 16
+    TRAILER_SIZE = 4
 
     def __init__(self, host, port, uid, pwd, logger):
         self.sock = None
+        # Buffer di ricezione riutilizzato tra i frame e frame ricevuti ma non ancora letti
+        self._parser = iAlarmMkFrameParser(bare_headers=())
+        self._frames = deque()
+        # Statistiche per comando: chiamate, errori e tempo totale
+        self.command_metrics = {}
 
         self.host = host
         self.port = port
@@ -96,21 +110,12 @@ class iAlarmMkClient:
             try:
                 self._print("Attempting to connect to the server.")
                 self.sock.connect((self.host, self.port))
+                self._parser.reset()
+                self._frames.clear()
                 self._print("Connection successful, proceeding with login to server.")
 
                 # Preparazione dei dati di login
-                cmd = OD()
-                cmd["Id"] = STR(self.uid)
-                cmd["Pwd"] = PWD(self.pwd)
-                cmd["Type"] = "TYP,ANDROID|0"
-                self.token = uuid.uuid4()
-                cmd["Token"] = STR(str(self.token))
-                cmd["Action"] = "TYP,IN|0"
-                cmd["PemNum"] = "STR,5|26"
-                cmd["DevVersion"] = None
-                cmd["DevType"] = None
-                cmd["Err"] = None
-                xpath = "/Root/Pair/Client"
+                xpath, cmd = self._login_cmd()
 
                 # Invio dei dati al server
                 self.client = self._(xpath, cmd)
@@ -142,6 +147,21 @@ class iAlarmMkClient:
                 self.close_socket()
                 raise ClientError("Unexpected error during login")
 
+    def _login_cmd(self):
+        '''Prepara il comando di login con un nuovo token.'''
+        cmd = OD()
+        cmd["Id"] = STR(self.uid)
+        cmd["Pwd"] = PWD(self.pwd)
+        cmd["Type"] = "TYP,ANDROID|0"
+        self.token = uuid.uuid4()
+        cmd["Token"] = STR(str(self.token))
+        cmd["Action"] = "TYP,IN|0"
+        cmd["PemNum"] = "STR,5|26"
+        cmd["DevVersion"] = None
+        cmd["DevType"] = None
+        cmd["Err"] = None
+        return "/Root/Pair/Client", cmd
+
     def close_socket(self):
         """Funzione ausiliaria per chiudere il socket in modo sicuro."""
         if self.sock:
@@ -165,551 +185,97 @@ class iAlarmMkClient:
         self._print(f"Logout socket with token: {self.token}")
         self.token = None
 
-    def GetAlarmStatus(self):
-        cmd = OD()
-        cmd["DevStatus"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetAlarmStatus"
-        return self._(xpath, cmd)
-
-    def GetByWay(self):
-        cmd = OD()
-        cmd["Total"] = None
-        cmd["Offset"] = S32(0)
-        cmd["Ln"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetByWay"
-        return self._(xpath, cmd, True)
-
-    def GetDefense(self):
-        cmd = OD()
-        cmd["Total"] = None
-        cmd["Offset"] = S32(0)
-        cmd["Ln"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetDefense"
-        return self._(xpath, cmd, True)
-
-    def GetEmail(self):
-        cmd = OD()
-        cmd["Ip"] = None
-        cmd["Port"] = None
-        cmd["User"] = None
-        cmd["Pwd"] = None
-        cmd["EmailSend"] = None
-        cmd["EmailRecv"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetEmail"
-        return self._(xpath, cmd)
-
-    def GetEvents(self):
-        cmd = OD()
-        cmd["Total"] = None
-        cmd["Offset"] = S32(0)
-        cmd["Ln"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetEvents"
-        return self._(xpath, cmd, True)
-
-    def GetGprs(self):
-        cmd = OD()
-        cmd["Apn"] = None
-        cmd["User"] = None
-        cmd["Pwd"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetGprs"
-        return self._(xpath, cmd)
-
-    def GetLog(self):
-        cmd = OD()
-        cmd["Total"] = None
-        cmd["Offset"] = S32(0)
-        cmd["Ln"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetLog"
-        return self._(xpath, cmd, True)
-
-    def GetNet(self):
-        cmd = OD()
-        cmd["Mac"] = None
-        cmd["Name"] = None
-        cmd["Ip"] = None
-        cmd["Gate"] = None
-        cmd["Subnet"] = None
-        cmd["Dns1"] = None
-        cmd["Dns2"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetNet"
-        return self._(xpath, cmd)
-
-    def GetOverlapZone(self):
-        cmd = OD()
-        cmd["Total"] = None
-        cmd["Offset"] = S32(0)
-        cmd["Ln"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetOverlapZone"
-        return self._(xpath, cmd, True)
-
-    def GetPairServ(self):
-        cmd = OD()
-        cmd["Ip"] = None
-        cmd["Port"] = None
-        cmd["Id"] = None
-        cmd["Pwd"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetPairServ"
-        return self._(xpath, cmd)
-
-    def GetPhone(self):
-        cmd = OD()
-        cmd["Total"] = None
-        cmd["Offset"] = S32(0)
-        cmd["Ln"] = None
-        cmd["RepeatCnt"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetPhone"
-        return self._(xpath, cmd, True)
-
-    def GetRemote(self):
-        cmd = OD()
-        cmd["Total"] = None
-        cmd["Offset"] = S32(0)
-        cmd["Ln"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetRemote"
-        return self._(xpath, cmd, True)
-
-    def GetRfid(self):
-        cmd = OD()
-        cmd["Total"] = None
-        cmd["Offset"] = S32(0)
-        cmd["Ln"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetRfid"
-        return self._(xpath, cmd, True)
-
-    def GetRfidType(self):
-        cmd = OD()
-        cmd["Total"] = None
-        cmd["Offset"] = S32(0)
-        cmd["Ln"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetRfidType"
-        return self._(xpath, cmd, True)
-
-    def GetSendby(self, cid):
-        cmd = OD()
-        cmd["Cid"] = STR(cid)
-        cmd["Tel"] = None
-        cmd["Voice"] = None
-        cmd["Sms"] = None
-        cmd["Email"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetSendby"
-        return self._(xpath, cmd)
-
-    def GetSensor(self):
-        cmd = OD()
-        cmd["Total"] = None
-        cmd["Offset"] = S32(0)
-        cmd["Ln"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetSensor"
-        return self._(xpath, cmd, True)
-
-    def GetServ(self):
-        cmd = OD()
-        cmd["En"] = None
-        cmd["Ip"] = None
-        cmd["Port"] = None
-        cmd["Name"] = None
-        cmd["Pwd"] = None
-        cmd["Cnt"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetServ"
-        return self._(xpath, cmd)
-
-    def GetSwitch(self):
-        cmd = OD()
-        cmd["Total"] = None
-        cmd["Offset"] = S32(0)
-        cmd["Ln"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetSwitch"
-        return self._(xpath, cmd, True)
-
-    def GetSwitchInfo(self):
-        cmd = OD()
-        cmd["Total"] = None
-        cmd["Offset"] = S32(0)
-        cmd["Ln"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetSwitchInfo"
-        return self._(xpath, cmd, True)
-
-    def GetSys(self):
-        cmd = OD()
-        cmd["InDelay"] = None
-        cmd["OutDelay"] = None
-        cmd["AlarmTime"] = None
-        cmd["WlLoss"] = None
-        cmd["AcLoss"] = None
-        cmd["ComLoss"] = None
-        cmd["ArmVoice"] = None
-        cmd["ArmReport"] = None
-        cmd["ForceArm"] = None
-        cmd["DoorCheck"] = None
-        cmd["BreakCheck"] = None
-        cmd["AlarmLimit"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetSys"
-        return self._(xpath, cmd)
-
-    def GetTel(self):
-        cmd = OD()
-        cmd["En"] = None
-        cmd["Code"] = None
-        cmd["Cnt"] = None
-        cmd["Total"] = None
-        cmd["Offset"] = S32(0)
-        cmd["Ln"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetTel"
-        return self._(xpath, cmd, True)
-
-    def GetTime(self):
-        cmd = OD()
-        cmd["En"] = None
-        cmd["Name"] = None
-        cmd["Type"] = None
-        cmd["Time"] = None
-        cmd["Dst"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetTime"
-        return self._(xpath, cmd)
-
-    def GetVoiceType(self):
-        cmd = OD()
-        cmd["Total"] = None
-        cmd["Offset"] = S32(0)
-        cmd["Ln"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetVoiceType"
-        return self._(xpath, cmd, True)
-
-    def GetZone(self):
-        cmd = OD()
-        cmd["Total"] = None
-        cmd["Offset"] = S32(0)
-        cmd["Ln"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetZone"
-        return self._(xpath, cmd, True)
-
-    def GetZoneType(self):
-        cmd = OD()
-        cmd["Total"] = None
-        cmd["Offset"] = S32(0)
-        cmd["Ln"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetZoneType"
-        return self._(xpath, cmd, True)
-
-    def WlsStudy(self):
-        cmd = OD()
-        cmd["Err"] = None
-        xpath = "/Root/Host/WlsStudy"
-        return self._(xpath, cmd)
-
-    def ConfigWlWaring(self):
-        cmd = OD()
-        cmd["Err"] = None
-        xpath = "/Root/Host/ConfigWlWaring"
-        return self._(xpath, cmd)
-
-    def FskStudy(self, en):
-        cmd = OD()
-        cmd["Study"] = BOL(en)
-        cmd["Err"] = None
-        xpath = "/Root/Host/FskStudy"
-        return self._(xpath, cmd)
-
-    def GetWlsStatus(self, num):
-        cmd = OD()
-        cmd["Num"] = S32(num)
-        cmd["Bat"] = None
-        cmd["Tamp"] = None
-        cmd["Status"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetWlsStatus"
-        return self._(xpath, cmd)
-
-    def DelWlsDev(self, num):
-        cmd = OD()
-        cmd["Num"] = S32(num)
-        cmd["Err"] = None
-        xpath = "/Root/Host/DelWlsDev"
-        return self._(xpath, cmd)
-
-    def WlsSave(self, typ, num, code):
-        cmd = OD()
-        cmd["Type"] = "TYP,NO|%d" % typ
-        cmd["Num"] = S32(num, 1)
-        cmd["Code"] = STR(code)
-        cmd["Err"] = None
-        xpath = "/Root/Host/WlsSave"
-        return self._(xpath, cmd)
-
-    def GetWlsList(self):
-        cmd = OD()
-        cmd["Total"] = None
-        cmd["Offset"] = S32(0)
-        cmd["Ln"] = None
-        cmd["Err"] = None
-        xpath = "/Root/Host/GetWlsList"
-        return self._(xpath, cmd)
-
-    def SwScan(self):
-        cmd = OD()
-        cmd["Err"] = None
-        xpath = "/Root/Host/SwScan"
-        return self._(xpath, cmd)
-
-    def Reset(self, ret):
-        cmd = OD()
-        cmd["Ret"] = BOL(ret)
-        cmd["Err"] = None
-        xpath = "/Root/Host/Reset"
-        return self._(xpath, cmd)
-
-    def OpSwitch(self, pos, en):
-        cmd = OD()
-        cmd["Pos"] = S32(pos, 1)
-        cmd["En"] = BOL(en)
-        cmd["Err"] = None
-        xpath = "/Root/Host/OpSwitch"
-        return self._(xpath, cmd)
-
-    def SetAlarmStatus(self, status):
-        cmd = OD()
-        cmd["DevStatus"] = TYP(status, ["ARM", "DISARM", "STAY", "CLEAR","","","","","PARTIAL"])
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetAlarmStatus"
-        return self._(xpath, cmd)
-
-    def SetByWay(self, pos, en):
-        cmd = OD()
-        cmd["Pos"] = S32(pos, 1)
-        cmd["En"] = BOL(en)
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetByWay"
-        return self._(xpath, cmd)
-
-    def SetDefense(self, pos, hmdef="00:00", hmundef="00:00"):
-        cmd = OD()
-        cmd["Pos"] = S32(pos, 1)
-        cmd["Def"] = STR(hmdef)
-        cmd["Undef"] = STR(hmundef)
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetDefense"
-        return self._(xpath, cmd)
-
-    def SetEmail(self, ip, port, user, pwd, emailsend, emailrecv):
-        cmd = OD()
-        cmd["Ip"] = STR(ip)
-        cmd["Port"] = S32(port)
-        cmd["User"] = STR(user)
-        cmd["Pwd"] = PWD(pwd)
-        cmd["EmailSend"] = STR(emailsend)
-        cmd["EmailRecv"] = STR(emailrecv)
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetEmail"
-        return self._(xpath, cmd)
-
-    def SetGprs(self, apn, user, pwd):
-        cmd = OD()
-        cmd["Apn"] = STR(apn)
-        cmd["User"] = STR(user)
-        cmd["Pwd"] = PWD(pwd)
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetGprs"
-        return self._(xpath, cmd)
-
-    def SetNet(self, mac, name, ip, gate, subnet, dns1, dns2):
-        cmd = OD()
-        cmd["Mac"] = MAC(mac)
-        cmd["Name"] = STR(name)
-        cmd["Ip"] = IPA(ip)
-        cmd["Gate"] = IPA(gate)
-        cmd["Subnet"] = IPA(subnet)
-        cmd["Dns1"] = IPA(dns1)
-        cmd["Dns2"] = IPA(dns2)
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetNet"
-        return self._(xpath, cmd)
-
-    def SetOverlapZone(self, pos, zone1, zone2, time):
-        cmd = OD()
-        cmd["Pos"] = S32(pos, 1)
-        cmd["Zone1"] = S32(pos, 1)
-        cmd["Zone1"] = S32(pos, 1)
-        cmd["Time"] = S32(pos, 1)
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetOverlapZone"
-        return self._(xpath, cmd)
-
-    def SetPairServ(self, ip, port, uid, pwd):
-        cmd = OD()
-        cmd["Ip"] = IPA(ip)
-        cmd["Port"] = S32(port, 1)
-        cmd["Id"] = STR(uid)
-        cmd["Pwd"] = PWD(pwd)
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetPairServ"
-        return self._(xpath, cmd)
-
-    def SetPhone(self, pos, num):
-        cmd = OD()
-        cmd["Type"] = TYP(1, ["F", "L"])
-        cmd["Pos"] = S32(pos, 1)
-        cmd["Num"] = STR(num)
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetPhone"
-        return self._(xpath, cmd)
-
-    def SetRfid(self, pos, code, typ, msg):
-        cmd = OD()
-        cmd["Pos"] = S32(pos, 1)
-        cmd["Type"] = S32(typ, ["NO", "DS", "HS", "DM" "HM", "DC"])
-        cmd["Code"] = STR(code)
-        cmd["Msg"] = STR(msg)
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetRfid"
-        return self._(xpath, cmd)
-
-    def SetRemote(self, pos, code):
-        cmd = OD()  #
-        cmd["Pos"] = S32(pos, 1)
-        cmd["Code"] = STR(code)
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetRemote"
-        return self._(xpath, cmd)
-
-    def SetSendby(self, cid, tel, voice, sms, email):
-        cmd = OD()
-        cmd["Cid"] = STR(cid)
-        cmd["Tel"] = BOL(tel)
-        cmd["Voice"] = BOL(voice)
-        cmd["Sms"] = BOL(sms)
-        cmd["Email"] = BOL(email)
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetSendby"
-        return self._(xpath, cmd)
-
-    def SetSensor(self, pos, code):
-        cmd = OD()
-        cmd["Pos"] = S32(pos, 1)
-        cmd["Code"] = STR(code)
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetSensor"
-        return self._(xpath, cmd)
-
-    def SetServ(self, en, ip, port, name, pwd, cnt):
-        cmd = OD()
-        cmd["En"] = BOL(en)
-        cmd["Ip"] = STR(ip)
-        cmd["Port"] = S32(port, 1)
-        cmd["Name"] = STR(name)
-        cmd["Pwd"] = PWD(pwd)
-        cmd["Cnt"] = S32(cnt, 1)
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetServ"
-        return self._(xpath, cmd)
-
-    def SetSwitch(self, pos, code):
-        cmd = OD()
-        cmd["Pos"] = S32(pos, 1)
-        cmd["Code"] = STR(code)
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetSwitch"
-        return self._(xpath, cmd)
-
-    def SetSwitchInfo(self, pos, name, hmopen="00:00", hmclose="00:00"):
-        cmd = OD()
-        cmd["Pos"] = S32(pos, 1)
-        cmd["Name"] = STR(name[:7].encode("hex"))
-        cmd["Open"] = STR(hmopen)
-        cmd["Close"] = STR(hmclose)
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetSwitchInfo"
-        return self._(xpath, cmd)
-
-    def SetSys(
-        self,
-        indelay,
-        outdelay,
-        alarmtime,
-        wlloss,
-        acloss,
-        comloss,
-        armvoice,
-        armreport,
-        forcearm,
-        doorcheck,
-        breakcheck,
-        alarmlimit,
-    ):
-        cmd = OD()
-        cmd["InDelay"] = S32(indelay, 1)
-        cmd["OutDelay"] = S32(outdelay, 1)
-        cmd["AlarmTime"] = S32(alarmtime, 1)
-        cmd["WlLoss"] = S32(wlloss, 1)
-        cmd["AcLoss"] = S32(acloss, 1)
-        cmd["ComLoss"] = S32(comloss, 1)
-        cmd["ArmVoice"] = BOL(armvoice)
-        cmd["ArmReport"] = BOL(armreport)
-        cmd["ForceArm"] = BOL(forcearm)
-        cmd["DoorCheck"] = BOL(doorcheck)
-        cmd["BreakCheck"] = BOL(breakcheck)
-        cmd["AlarmLimit"] = BOL(alarmlimit)
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetSys"
-        return self._(xpath, cmd)
-
-    def SetTel(self, en, code, cnt):
-        cmd = OD()
-        cmd["Typ"] = TYP(0, ["F", "L"])
-        cmd["En"] = BOL(en)
-        cmd["Code"] = int(code)
-        cmd["Cnt"] = S32(cnt, 1)
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetTel"
-        return self._(xpath, cmd)
-
-    def SetTime(self, en, name, typ, time, dst):
-        cmd = OD()
-        cmd["En"] = BOL(en)
-        cmd["Name"] = STR(name)
-        cmd["Type"] = "TYP,0|%d" % typ
-        cmd["Time"] = DTA(time)
-        cmd["Dst"] = BOL(dst)
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetTime"
-        return self._(xpath, cmd)
-
-    def SetZone(self, pos, typ, voice, name, bell):
-        cmd = OD()
-        cmd["Pos"] = S32(pos, 1)
-        cmd["Type"] = TYP(
-            typ, ["NO", "DE", "SI", "IN", "FO", "HO24", "FI", "KE", "GAS", "WT"]
-        )
-        cmd["Voice"] = TYP(voice, ["CX", "MC", "NO"])
-        cmd["Name"] = STR(name)
-        cmd["Bell"] = BOL(bell)
-        cmd["Err"] = None
-        xpath = "/Root/Host/SetZone"
-        return self._(xpath, cmd)
+    def _run_command(self, spec, cmd):
+        if spec.name in _DATED_COMMANDS and self.needs_timezone():
+            # Il fuso della centrale serve per restituire datetime con timezone
+            self.GetTime()
+        started = time.monotonic()
+        try:
+            result = self._(spec.xpath, cmd, spec.is_list, cache=spec.cache)
+        except Exception:
+            self._record_command(spec.name, started, True)
+            raise
+        self._record_command(spec.name, started, False)
+        if spec.name == "GetTime":
+            result = self._set_timezone(result)
+        return result
+
+    def needs_timezone(self):
+        '''True se il fuso della centrale va letto con GetTime prima di decodificare delle date.'''
+        if self.tzinfo is not None:
+            return False
+        return self._tz_failed_at is None or time.monotonic() - self._tz_failed_at >= self.TZ_RETRY_INTERVAL
+
+    def _set_timezone(self, info):
+        '''Memorizza il fuso della centrale letto da GetTime e lo applica al suo campo Time.'''
+        self.tzinfo = panel_timezone(info)
+        self._tz_failed_at = time.monotonic() if self.tzinfo is None else None
+        if self.tzinfo is not None and isinstance(info.get("Time"), datetime):
+            info["Time"] = info["Time"].replace(tzinfo=self.tzinfo)
+        return info
+
+    def _record_command(self, name, started, failed):
+        metrics = self.command_metrics.get(name)
+        if metrics is None:
+            metrics = self.command_metrics[name] = {"calls": 0, "errors": 0, "time": 0.0}
+        metrics["calls"] += 1
+        metrics["errors"] += failed
+        metrics["time"] += time.monotonic() - started
+
+    def get_list_item(self, name, index):
+        '''Legge un solo elemento di un comando lista (es. una zona di GetByWay) partendo dal suo offset.'''
+        spec = _list_spec(name)
+        for item in self.iter_list(spec.xpath, spec.build(), offset=index, cache=spec.cache):
+            return item
+        return None
+
+    def fetch_since(self, name, cursor=None):
+        '''Scarica da GetLog o GetEvents solo le voci successive al cursore.
+
+        Le pagine vengono richieste finché non si incontra la voce più recente già
+        acquisita. Restituisce (voci nuove dalla più recente, cursore aggiornato).
+        '''
+        spec = _cursor_spec(name)
+        if self.needs_timezone():
+            self.GetTime()
+        cursor = cursor or iAlarmMkLogCursor()
+        rows = []
+        started = time.monotonic()
+        try:
+            for row in self.iter_list(spec.xpath, spec.build(), cache=spec.cache):
+                if cursor.reached(row):
+                    break
+                rows.append(row)
+        except Exception:
+            self._record_command(name, started, True)
+            raise
+        self._record_command(name, started, False)
+        return rows, cursor.advance(rows)
+
+    def batch(self, commands):
+        '''Esegue in ordine una lista di comandi con un solo login.
+
+        Ogni comando può essere il nome (es. "GetByWay"), una tupla (nome, arg1, ...)
+        o un dict {"command": nome, "args": [...]}. Restituisce per ogni comando un dict
+        con "command", "result" ed "error". Un comando sconosciuto o non ammesso solleva
+        ValueError prima del login.
+        '''
+        commands = _batch_commands(commands)
+        results = []
+        reconnect = True
+        try:
+            for name, args in commands:
+                try:
+                    if reconnect:
+                        self.login()
+                        reconnect = False
+                    results.append({"command": name, "result": getattr(self, name)(*args), "error": None})
+                except Exception as e:
+                    reconnect = isinstance(e, ConnectionError)
+                    results.append({"command": name, "result": None, "error": str(e) or type(e).__name__})
+        finally:
+            self.logout()
+        return results
 
     def _print(self, data):
         if self.logger is not None:
@@ -717,67 +283,114 @@ class iAlarmMkClient:
         else:
             print(str(data))
 
-    def _(self, xpath, cmd, is_list=False, offset=0, l=None):
+    def iter_list(self, xpath, cmd=None, offset=0, cache=False):
+        '''Restituisce gli elementi di un comando lista (es. /Root/Host/GetLog) pagina per pagina.
+
+        Le pagine vengono richieste solo quando servono: interrompendo l'iterazione
+        non viene inviata nessuna ulteriore richiesta al server.
+        '''
+        if cmd is None:
+            cmd = _list_cmd()
+        while True:
+            if offset > 0:
+                cmd["Offset"] = S32(offset)
+            self._send(xpath, cmd, cache)
+            total, items = _list_page(_find_element(self._receive(), xpath), self.tzinfo)
+            yield from items
+            offset += len(items)
+            if not items or total <= offset:
+                return
+
+    def _(self, xpath, cmd, is_list=False, offset=0, cache=False):
+        if is_list:
+            return list(self.iter_list(xpath, cmd, offset, cache))
         if offset > 0:
             cmd["Offset"] = S32(offset)
-        root = self._create(xpath, cmd)
-        self._send(root)
-        resp = self._receive()
-        #self._print(f"*** response: \n{resp}\n**********")
-        if is_list == False:
-            return self._select(resp, xpath)
-        if l is None:
-            l = []
-        total = self._select(resp, "%s/Total" % xpath)
-        ln = self._select(resp, "%s/Ln" % xpath)
-        for i in list(range(ln)):
-            event = self._select(resp, "%s/L%d" % (xpath, i))
-            l.append(self._select(resp, "%s/L%d" % (xpath, i)))
-        offset += ln
-        if total > offset:
-            self._(xpath, cmd, is_list, offset, l)
-        return l
-
-    def _send(self, root):
-        xml: str = etree.tostring(self._convert_dict_to_xml(root), pretty_print=False)
-        self.seq += 1
+        self._send(xpath, cmd, cache)
+        node = _find_element(self._receive(), xpath)
+        return _element_to_value(node, self.tzinfo) if node is not None else None
+
+    def _encode(self, xpath, cmd):
+        '''Serializza il comando in XML usando il template precompilato per la sua forma.'''
+        if any(isinstance(value, (dict, list)) for value in cmd.values()):
+            return etree.tostring(self._convert_dict_to_xml(self._create(xpath, cmd)), pretty_print=False)
+        return _encode_xml(xpath, cmd)
+
+    def _frame_payload(self, xpath, cmd, cache=False):
+        '''Restituisce (lunghezza XML, payload cifrato).
+
+        Con `cache` (solo i comandi di lettura senza parametri, vedi CommandSpec) riusa
+        il payload già calcolato per lo stesso comando e la stessa pagina.
+        '''
+        key = (xpath, tuple(cmd.items())) if cache else None
+        entry = _frame_cache.get(key) if key is not None else None
+        if entry is not None:
+            _frame_cache.move_to_end(key)
+            return entry
+        xml = self._encode(xpath, cmd)
+        entry = (len(xml), self._xor(xml))
+        if key is not None:
+            _frame_cache[key] = entry
+            if len(_frame_cache) > _FRAME_CACHE_SIZE:
+                # Scarta il payload usato meno di recente
+                _frame_cache.popitem(last=False)
+        return entry
+
+    def _send(self, xpath, cmd, cache=False):
+        length, payload = self._frame_payload(xpath, cmd, cache)
+        # Il numero di sequenza occupa 4 cifre nell'header e nel trailer
+        self.seq = self.seq % 9999 + 1
         mesg = b"@ieM%04d%04d0000%s%04d" % (
-            len(xml),
+            length,
             self.seq,
-            self._xor(xml),
+            payload,
             self.seq,
         )
         self.sock.send(mesg)
 
     def _receive(self):
         try:
-            data = self.sock.recv(1024)
-            if data is None:
-                self._print("Data received is null")
-            else:
-                self._print(f"Data received is length: {len(data)}")
+            data = self._recv_frame()
         except socket.timeout:
             raise ConnectionError("Connection timed out")
         except OSError as e:
             self.sock.shutdown(socket.SHUT_RDWR)
             self.sock.close()
             raise ConnectionError("Connection error")
-        return xmltodict.parse(
-            self._xor(data[16:-4]).decode(),
-            xml_attribs=False,
-            dict_constructor=dict,
-            postprocessor=self._xmlread,
-        )
+        self._print(f"Data received is length: {len(data)}")
+        # Lo XOR legge direttamente dal buffer di ricezione
+        return self._parse(self._xor(data))
+
+    def _parse(self, data):
+        '''Esegue il parsing dei byte XML decifrati e restituisce l'elemento radice.'''
+        try:
+            return etree.fromstring(bytes(data))
+        except etree.XMLSyntaxError as e:
+            raise ResponseError(f"Invalid XML response: {e}")
+
+    def _recv_frame(self):
+        '''Legge un frame "@ieM" completo e ne restituisce il payload.
+
+        Il socket scrive direttamente nel buffer del parser (recv_into) e il payload è
+        una memoryview su quel buffer, valida fino alla lettura successiva.
+        '''
+        while not self._frames:
+            n = self.sock.recv_into(self._parser.get_buffer())
+            if n == 0:
+                raise ConnectionError("Connection closed by peer")
+            self._frames.extend(self._parser.buffer_updated(n))
+        head, _seq, payload = self._frames.popleft()
+        if head != b"@ieM":
+            self._parser.reset()
+            self._frames.clear()
+            raise ResponseError(f"Unexpected frame header: {head}")
+        return payload
 
     def _xor(self, input):
-        sz = bytearray.fromhex(
-            "0c384e4e62382d620e384e4e44382d300f382b382b0c5a6234384e304e4c372b10535a0c20432d171142444e58422c421157322a204036172056446262382b5f0c384e4e62382d620e385858082e232c0f382b382b0c5a62343830304e2e362b10545a0c3e432e1711384e625824371c1157324220402c17204c444e624c2e12"
-        )
-        buf = bytearray(input)
-        for i in range(len(input)):
-            ki = i & 0x7F
-            buf[i] = buf[i] ^ sz[ki]
-        return buf
+        n = len(input)
+        key = _keystream(n)
+        out = int.from_bytes(input, "little") ^ int.from_bytes(memoryview(key)[:n], "little")
+        return out.to_bytes(n, "little")
 
     def _create(self, path, mydict={}):
         root = {}
@@ -794,73 +407,6 @@ class iAlarmMkClient:
             pass
         return root
 
-    def _select(self, mydict, path):
-        elem = mydict
-        try:
-            for i in path.strip("/").split("/"):
-                try:
-                    i = int(i)
-                    elem = elem[i]
-                except ValueError:
-                    elem = elem.get(i)
-        except:
-            pass
-        return elem
-
-    def _xmlread(self, path, key, value):
-        try:
-            input = value
-            BOL = re.compile(r"BOL\|([FT])")
-            DTA = re.compile(r"DTA(,\d+)*\|(\d{4}\.\d{2}.\d{2}.\d{2}.\d{2}.\d{2})")
-            ERR = re.compile(r"ERR\|(\d{2})")
-            GBA = re.compile(r"GBA,(\d+)\|([0-9A-F]*)")
-            HMA = re.compile(r"HMA,(\d+)\|(\d{2}:\d{2})")
-            IPA = re.compile(r"IPA,(\d+)\|(([0-2]?\d{0,2}\.){3}([0-2]?\d{0,2}))")
-            MAC = re.compile(r"MAC,(\d+)\|(([0-9A-F]{2}[:-]){5}([0-9A-F]{2}))")
-            NEA = re.compile(r"NEA,(\d+)\|([0-9A-F]+)")
-            NUM = re.compile(r"NUM,(\d+),(\d+)\|(\d*)")
-            PWD = re.compile(r"PWD,(\d+)\|(.*)")
-            S32 = re.compile(r"S32,(\d+),(\d+)\|(\d*)")
-            STR = re.compile(r"STR,(\d+)\|(.*)")
-            TYP = re.compile(r"TYP,(\w+)\|(\d+)")
-            if BOL.match(input):
-                bol = BOL.search(input).groups()[0]
-                if bol == "T":
-                    value = True
-                if bol == "F":
-                    value = False
-            elif DTA.match(input):
-                dta = DTA.search(input).groups()[1]
-                value = time.strptime(dta, "%Y.%m.%d.%H.%M.%S")
-            elif ERR.match(input):
-                value = int(ERR.search(input).groups()[0])
-            elif GBA.match(input):
-                value = bytearray.fromhex(GBA.search(input).groups()[1]).decode()
-            elif HMA.match(input):
-                hma = HMA.search(input).groups()[1]
-                value = time.strptime(hma, "%H:%M")
-            elif IPA.match(input):
-                value = str(IPA.search(input).groups()[1])
-            elif MAC.match(input):
-                value = str(MAC.search(input).groups()[1])
-            elif NEA.match(input):
-                value = str(NEA.search(input).groups()[1])
-            elif NUM.match(input):
-                value = str(NUM.search(input).groups()[2])
-            elif PWD.match(input):
-                value = str(PWD.search(input).groups()[1])
-            elif S32.match(input):
-                value = int(S32.search(input).groups()[2])
-            elif STR.match(input):
-                value = str(STR.search(input).groups()[1])
-            elif TYP.match(input):
-                value = int(TYP.search(input).groups()[1])
-            else:
-                raise ResponseError(f"Unknown data type {format(input)}")
-            return key, value
-        except (ValueError, TypeError):
-            return key, value
-
     @staticmethod
     def _convert_dict_to_xml_recurse(parent: etree.Element, dictitem: dict) -> None:
         assert not isinstance(dictitem, type([]))
@@ -890,13 +436,604 @@ class iAlarmMkClient:
         return root
 
 
-class iAlarmMkPushClient(asyncio.Protocol, iAlarmMkClient):
+class iAlarmMkAsyncClient(iAlarmMkClient):
+    '''Client asyncio con gli stessi comandi di iAlarmMkClient, restituiti come coroutine.
+
+    Con `multiplex=True` più comandi possono essere in volo sulla stessa connessione:
+    ogni risposta viene associata alla richiesta tramite il numero di sequenza del frame.
+    '''
+
+    def __init__(self, host, port, uid, pwd, logger, multiplex=False):
+        super().__init__(host, port, uid, pwd, logger)
+        self.transport: asyncio.Transport = None
+        self._protocol: iAlarmMkClientProtocol = None
+        self.multiplex = multiplex
+        # Senza multiplexing un solo comando alla volta sulla connessione
+        self._lock = asyncio.Lock()
+        # Richieste in attesa di risposta, indicizzate per numero di sequenza
+        self._pending = {}
+
+    def __del__(self):
+        if self.transport is not None:
+            try:
+                self.transport.close()
+            except Exception:
+                pass
+
+    def is_connected(self):
+        return self.transport is not None and not self.transport.is_closing()
+
+    async def login(self):
+        self._print("Async login method called.")
+        if self.is_connected():
+            self._print("Connection already open.")
+            return
+        try:
+            self._print("Attempting to connect to the server.")
+            loop = asyncio.get_running_loop()
+            self.transport, self._protocol = await asyncio.wait_for(
+                loop.create_connection(lambda: iAlarmMkClientProtocol(self), self.host, self.port), self.timeout
+            )
+            self._print("Connection successful, proceeding with login to server.")
+
+            xpath, cmd = self._login_cmd()
+            self.client = await self._(xpath, cmd)
+
+            if not self.client or self.client.get("Err"):
+                err = self.client.get("Err") if self.client else None
+                self._print(f"Error during login to the server: {err}, token used is {self.token}")
+                await self.logout()
+                raise LoginError("Login error")
+            self._print(f"Login ok, token used is {self.token}")
+
+        except LoginError:
+            raise
+
+        except (TimeoutError, asyncio.TimeoutError) as e:
+            self._print(f"Connection timeout: {e}")
+            await self.logout()
+            raise ConnectionError("Connection error: timeout")
+
+        except ConnectionRefusedError as e:
+            self._print(f"Connection refused by the server: {e}")
+            await self.logout()
+            raise ConnectionError("Connection error: connection refused")
+
+        except (OSError, ConnectionError) as e:
+            self._print(f"Network error: {e}")
+            await self.logout()
+            raise ConnectionError("Connection error: network error")
+
+        except Exception as e:
+            self._print(f"Unexpected error during login: {e}")
+            await self.logout()
+            raise ClientError("Unexpected error during login")
+
+    async def logout(self):
+        self._print("Async logout method called.")
+        transport, protocol = self.transport, self._protocol
+        self.transport = None
+        self._protocol = None
+        self._fail_pending(ConnectionError("Connection closed"))
+        if transport is None:
+            return
+        try:
+            transport.close()
+            await protocol.wait_closed()
+        except Exception as e:
+            self._print(f"Error closing connection: {e}")
+        self._print(f"Logout connection with token: {self.token}")
+        self.token = None
+
+    async def _run_command(self, spec, cmd):
+        if spec.name in _DATED_COMMANDS and self.needs_timezone():
+            await self.GetTime()
+        started = time.monotonic()
+        try:
+            result = await self._(spec.xpath, cmd, spec.is_list, cache=spec.cache)
+        except Exception:
+            self._record_command(spec.name, started, True)
+            raise
+        self._record_command(spec.name, started, False)
+        if spec.name == "GetTime":
+            result = self._set_timezone(result)
+        return result
+
+    async def get_list_item(self, name, index):
+        '''Versione asincrona di iAlarmMkClient.get_list_item.'''
+        spec = _list_spec(name)
+        async with aclosing(self.iter_list(spec.xpath, spec.build(), offset=index, cache=spec.cache)) as items:
+            async for item in items:
+                return item
+        return None
+
+    async def fetch_since(self, name, cursor=None):
+        '''Versione asincrona di iAlarmMkClient.fetch_since.'''
+        spec = _cursor_spec(name)
+        if self.needs_timezone():
+            await self.GetTime()
+        cursor = cursor or iAlarmMkLogCursor()
+        rows = []
+        started = time.monotonic()
+        try:
+            async with aclosing(self.iter_list(spec.xpath, spec.build(), cache=spec.cache)) as items:
+                async for row in items:
+                    if cursor.reached(row):
+                        break
+                    rows.append(row)
+        except Exception:
+            self._record_command(name, started, True)
+            raise
+        self._record_command(name, started, False)
+        return rows, cursor.advance(rows)
+
+    async def batch(self, commands):
+        '''Versione asincrona di iAlarmMkClient.batch, sulla connessione già autenticata.'''
+        return await self._run_batch(_batch_commands(commands))
+
+    async def _run_batch(self, commands):
+        '''Esegue i comandi di un batch già verificati da _batch_commands.'''
+        results = []
+        for name, args in commands:
+            try:
+                if not self.is_connected():
+                    await self.login()
+                results.append({"command": name, "result": await getattr(self, name)(*args), "error": None})
+            except Exception as e:
+                results.append({"command": name, "result": None, "error": str(e) or type(e).__name__})
+        return results
+
+    async def iter_list(self, xpath, cmd=None, offset=0, cache=False):
+        '''Versione asincrona di iAlarmMkClient.iter_list, da usare con `async for`.'''
+        if cmd is None:
+            cmd = _list_cmd()
+        while True:
+            if offset > 0:
+                cmd["Offset"] = S32(offset)
+            total, items = _list_page(_find_element(await self._request(xpath, cmd, cache), xpath), self.tzinfo)
+            for item in items:
+                yield item
+            offset += len(items)
+            if not items or total <= offset:
+                return
+
+    async def _(self, xpath, cmd, is_list=False, offset=0, cache=False):
+        if is_list:
+            return [item async for item in self.iter_list(xpath, cmd, offset, cache)]
+        if offset > 0:
+            cmd["Offset"] = S32(offset)
+        node = _find_element(await self._request(xpath, cmd, cache), xpath)
+        return _element_to_value(node, self.tzinfo) if node is not None else None
+
+    async def _request(self, xpath, cmd, cache=False):
+        '''Invia un comando e restituisce l'elemento radice della sua risposta.'''
+        if self.multiplex:
+            return await self._receive(await self._send(xpath, cmd, cache))
+        async with self._lock:
+            return await self._receive(await self._send(xpath, cmd, cache))
+
+    async def _send(self, xpath, cmd, cache=False):
+        '''Scrive il comando e restituisce il future della sua risposta.'''
+        if not self.is_connected():
+            raise ConnectionError("Not connected")
+        length, payload = self._frame_payload(xpath, cmd, cache)
+        self.seq = self.seq % 9999 + 1
+        # Registrata prima di scrivere: la risposta può arrivare prima del drain
+        future = self._pending[self.seq] = asyncio.get_running_loop().create_future()
+        self.transport.write(b"@ieM%04d%04d0000%s%04d" % (length, self.seq, payload, self.seq))
+        try:
+            await self._protocol.drain()
+        except OSError as e:
+            self._print(f"Error sending command {xpath}: {e}")
+            await self.logout()
+            raise ConnectionError("Connection error")
+        return future
+
+    async def _receive(self, future):
+        try:
+            data = await asyncio.wait_for(future, self.timeout)
+        except (TimeoutError, asyncio.TimeoutError):
+            await self.logout()
+            raise ConnectionError("Connection timed out")
+        except (ConnectionError, ResponseError):
+            # Connessione caduta o stream non più allineato ai frame
+            await self.logout()
+            raise
+        self._print(f"Data received is length: {len(data)}")
+        return self._parse(data)
+
+    def _response_received(self, protocol, seq, data):
+        '''Consegna una risposta già decifrata alla richiesta in attesa.'''
+        if protocol is not self._protocol:
+            return
+        if self.multiplex:
+            future = self._pending.pop(seq, None)
+        else:
+            # Un solo comando alla volta: la risposta è della richiesta in attesa
+            future = self._pending.popitem()[1] if self._pending else None
+        if future is None:
+            self._print(f"Received response for unknown sequence number {seq}, discarded.")
+            return
+        if not future.done():
+            future.set_result(data)
+
+    def _connection_failed(self, protocol, exc):
+        if protocol is self._protocol:
+            self._fail_pending(exc)
+
+    def _fail_pending(self, exc):
+        pending = self._pending
+        self._pending = {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(exc)
+
+
+class iAlarmMkClientProtocol(asyncio.BufferedProtocol):
+    '''Connessione di iAlarmMkAsyncClient.
+
+    Il transport riceve direttamente nel buffer preallocato di iAlarmMkFrameParser;
+    ogni risposta viene decifrata dal buffer e consegnata al client.
+    '''
+
+    def __init__(self, client):
+        self.client = client
+        self.transport = None
+        self._parser = iAlarmMkFrameParser(bare_headers=())
+        self._closed = asyncio.get_running_loop().create_future()
+        # Controllo di flusso in scrittura, come StreamWriter.drain
+        self._paused = False
+        self._drain_waiter = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def get_buffer(self, sizehint):
+        return self._parser.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
+        try:
+            for head, seq, payload in self._parser.buffer_updated(nbytes):
+                if head != b"@ieM":
+                    raise ResponseError(f"Unexpected frame header: {head}")
+                # Il payload è valido fino alla prossima ricezione: lo XOR ne fa la copia decifrata
+                self.client._response_received(self, seq, self.client._xor(payload))
+        except ResponseError as e:
+            # Lo stream non è più allineato ai frame
+            self.client._connection_failed(self, e)
+            self.transport.close()
+
+    def connection_lost(self, exc):
+        if not self._closed.done():
+            self._closed.set_result(None)
+        self._wake_writer(ConnectionResetError("Connection lost"))
+        self.client._connection_failed(self, ConnectionError("Connection error"))
+
+    def pause_writing(self):
+        self._paused = True
+
+    def resume_writing(self):
+        self._paused = False
+        self._wake_writer()
+
+    def _wake_writer(self, exc=None):
+        waiter, self._drain_waiter = self._drain_waiter, None
+        if waiter is None or waiter.done():
+            return
+        if exc is None:
+            waiter.set_result(None)
+        else:
+            waiter.set_exception(exc)
+
+    async def drain(self):
+        '''Attende che il transport abbia spazio per scrivere.'''
+        if self.transport.is_closing():
+            raise ConnectionResetError("Connection lost")
+        if self._paused:
+            self._drain_waiter = asyncio.get_running_loop().create_future()
+            await self._drain_waiter
+
+    async def wait_closed(self):
+        await self._closed
+
+
+class iAlarmMkSession:
+    '''Mantiene aperta e autenticata una connessione di iAlarmMkAsyncClient tra un comando e l'altro.
+
+    La sessione viene rinnovata quando supera `max_age` secondi o `max_errors` errori,
+    chiusa dopo `idle_timeout` secondi di inattività e riaperta in automatico al bisogno.
+    '''
+
+    def __init__(self, client, idle_timeout=300, max_age=3600, max_errors=3, logger=None):
+        self.client: iAlarmMkAsyncClient = client
+        self.idle_timeout = idle_timeout
+        self.max_age = max_age
+        self.max_errors = max_errors
+        self.logger = logger
+        self.connect_count = 0
+        self.login_count = 0
+        self.command_count = 0
+        self.error_count = 0
+        self.rotation_count = 0
+        self._opened_at = None
+        self._session_errors = 0
+        self._users = 0
+        self._idle_handle = None
+        self._open_lock = asyncio.Lock()
+
+    @property
+    def stats(self):
+        return {
+            "connects": self.connect_count,
+            "logins": self.login_count,
+            "commands": self.command_count,
+            "errors": self.error_count,
+            "rotations": self.rotation_count,
+        }
+
+    def is_open(self):
+        return self.client.is_connected()
+
+    async def _open(self):
+        async with self._open_lock:
+            if self.is_open() and not self._must_rotate():
+                return
+            if self.is_open():
+                self._print("Session expired, rotating.")
+                self.rotation_count += 1
+                await self.client.logout()
+            self.connect_count += 1
+            await self.client.login()
+            self.login_count += 1
+            self._opened_at = time.monotonic()
+            self._session_errors = 0
+
+    def _must_rotate(self):
+        if self._session_errors >= self.max_errors:
+            return True
+        return self._opened_at is not None and time.monotonic() - self._opened_at > self.max_age
+
+    @asynccontextmanager
+    async def acquire(self):
+        '''Restituisce il client con una sessione autenticata valida, da usare con `async with`.'''
+        self._cancel_idle()
+        self._users += 1
+        try:
+            await self._open()
+            yield self.client
+        except ConnectionError:
+            # La connessione è già chiusa dal client, la prossima richiesta rifà il login
+            self.error_count += 1
+            self._opened_at = None
+            raise
+        except Exception:
+            self.error_count += 1
+            self._session_errors += 1
+            raise
+        finally:
+            self._users -= 1
+            if self._users == 0:
+                self._schedule_idle()
+
+    async def call(self, command, *args):
+        '''Esegue un comando (es. "GetByWay") ripetendo il login una volta se la connessione è caduta.'''
+        try:
+            async with self.acquire() as client:
+                self.command_count += 1
+                return await getattr(client, command)(*args)
+        except ConnectionError as e:
+            self._print(f"Session lost ({e}), logging in again.")
+            await self.client.logout()
+            async with self.acquire() as client:
+                self.command_count += 1
+                return await getattr(client, command)(*args)
+
+    async def batch(self, commands):
+        '''Esegue una lista di comandi (vedi iAlarmMkClient.batch) all'interno della stessa sessione.'''
+        # I nomi si verificano prima di aprire la sessione: un batch non valido non la tocca
+        commands = _batch_commands(commands)
+        async with self.acquire() as client:
+            self.command_count += len(commands)
+            results = await client._run_batch(commands)
+        self.error_count += sum(1 for result in results if result["error"] is not None)
+        return results
+
+    async def close(self):
+        self._cancel_idle()
+        self._opened_at = None
+        await self.client.logout()
+
+    def _schedule_idle(self):
+        if self.idle_timeout is None:
+            return
+        loop = asyncio.get_running_loop()
+        self._idle_handle = loop.call_later(self.idle_timeout, self._expire, loop)
+
+    def _cancel_idle(self):
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+
+    def _expire(self, loop):
+        self._idle_handle = None
+        if self._users == 0 and self.is_open():
+            loop.create_task(self._close_idle())
+
+    async def _close_idle(self):
+        # Un comando potrebbe essere partito dopo la scadenza del timer
+        if self._users == 0:
+            self._print("Session idle, closing connection.")
+            await self.close()
+
+    def _print(self, data):
+        if self.logger is not None:
+            self.logger.debug(str(data))
+        else:
+            print(str(data))
+
+
+class iAlarmMkLogCursor:
+    '''Posizione dell'ultima voce già acquisita da GetLog o GetEvents.
+
+    La centrale restituisce le voci dalla più recente: il cursore conserva la data
+    della voce più recente e l'hash del contenuto delle voci con quella data, così
+    da riconoscere anche più eventi nello stesso secondo. Le date sono sempre in UTC,
+    così un cursore salvato resta confrontabile con le voci lette dopo un riavvio.
+    '''
+
+    def __init__(self, time=None, digests=()):
+        self.time = _as_utc(time) if time is not None else None
+        self.digests = frozenset(digests)
+
+    def __eq__(self, other):
+        return isinstance(other, iAlarmMkLogCursor) and (self.time, self.digests) == (other.time, other.digests)
+
+    def __repr__(self):
+        return f"iAlarmMkLogCursor(time={self.time!r}, digests={sorted(self.digests)!r})"
+
+    def reached(self, row):
+        '''True se la voce (e quindi tutte le successive, più vecchie) è già stata acquisita.'''
+        if self.time is None and not self.digests:
+            return False
+        when = _row_time(row)
+        if self.time is not None and when is not None and when != self.time:
+            return when < self.time
+        return _row_digest(row) in self.digests
+
+    def advance(self, rows):
+        '''Restituisce il cursore posizionato sulla più recente delle voci nuove.'''
+        if not rows:
+            return self
+        newest = _row_time(rows[0])
+        digests = {_row_digest(row) for row in rows if _row_time(row) == newest}
+        if newest is not None and newest == self.time:
+            digests |= self.digests
+        return iAlarmMkLogCursor(newest, digests)
+
+    def as_dict(self):
+        '''Rappresentazione serializzabile in JSON, per salvare il cursore.'''
+        return {
+            "time": self.time.isoformat() if self.time is not None else None,
+            "digests": sorted(self.digests),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data:
+            return cls()
+        when = data.get("time")
+        return cls(datetime.fromisoformat(when) if when else None, data.get("digests") or ())
+
+class iAlarmMkFrameParser:
+    '''Estrae i frame completi da uno stream TCP, comunque sia suddiviso in chunk.
+
+    I dati si ricevono direttamente nel buffer preallocato del parser: get_buffer e
+    buffer_updated hanno la forma dei metodi di asyncio.BufferedProtocol, e i payload
+    restituiti sono memoryview su quel buffer, senza copie.
+    '''
+
+    HEADER_SIZE = 16
+    TRAILER_SIZE = 4
+    BUFFER_SIZE = 4096
+
+    def __init__(self, bare_headers=(b"%maI",), size=BUFFER_SIZE):
+        # Header che arrivano da soli, senza lunghezza né payload (es. risposta al keepalive)
+        self.bare_headers = frozenset(bare_headers)
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        # Inizio dei byte non ancora consumati e fine dei byte ricevuti
+        self._start = 0
+        self._end = 0
+        # Dimensione del frame incompleto in testa ai byte non consumati
+        self._wanted = 0
+        # memoryview dei payload restituiti, da rilasciare prima di riscrivere il buffer
+        self._views = []
+
+    def get_buffer(self, sizehint=-1):
+        '''Restituisce lo spazio libero del buffer, dove ricevere almeno `sizehint` byte.
+
+        I payload restituiti dalla chiamata precedente non sono più validi.
+        '''
+        self._release()
+        pending = self._end - self._start
+        if self._start:
+            # Sposta in testa i byte di un frame non ancora completo
+            if pending:
+                self._buffer[:pending] = self._buffer[self._start:self._end]
+            self._start = 0
+            self._end = pending
+        needed = max(sizehint, self._wanted - pending, 1)
+        if len(self._buffer) - self._end < needed:
+            self._view.release()
+            self._buffer.extend(bytes(self._end + needed - len(self._buffer)))
+            self._view = memoryview(self._buffer)
+        return self._view[self._end:]
+
+    def buffer_updated(self, nbytes):
+        '''Registra `nbytes` byte ricevuti in get_buffer e restituisce i frame completi
+        come (header, numero di sequenza, payload).
+        '''
+        self._end += nbytes
+        buf = self._buffer
+        frames = []
+        pos = self._start
+        end = self._end
+        self._wanted = 0
+        while end - pos >= 4:
+            head = bytes(buf[pos:pos + 4])
+            if head in self.bare_headers:
+                frames.append((head, None, b""))
+                pos += 4
+                continue
+            if end - pos < self.HEADER_SIZE:
+                break
+            try:
+                length = int(buf[pos + 4:pos + 8])
+            except ValueError:
+                # Stream non più allineato, i dati restanti non sono recuperabili
+                self.reset()
+                raise ResponseError(f"Invalid frame length for header {head}")
+            size = self.HEADER_SIZE + length + self.TRAILER_SIZE
+            if end - pos < size:
+                self._wanted = size
+                break
+            try:
+                seq = int(buf[pos + 8:pos + 12])
+            except ValueError:
+                seq = None
+            view = self._view[pos + self.HEADER_SIZE:pos + size - self.TRAILER_SIZE]
+            self._views.append(view)
+            frames.append((head, seq, view))
+            pos += size
+        self._start = pos
+        return frames
+
+    def feed(self, data):
+        '''Copia nel buffer i dati ricevuti (es. da data_received) e restituisce i frame completi.
+
+        I payload sono memoryview sul buffer interno, valide fino alla chiamata successiva.
+        '''
+        size = len(data)
+        self.get_buffer(size)[:size] = data
+        return self.buffer_updated(size)
+
+    def _release(self):
+        for view in self._views:
+            view.release()
+        self._views.clear()
+
+    def reset(self):
+        self._release()
+        self._start = self._end = self._wanted = 0
+
+
+class iAlarmMkPushClient(asyncio.BufferedProtocol, iAlarmMkClient):
 
     daemon = True
     keepalive = 60
     timeout = 10
 
-    def __init__(self, host, port, uid, handler, loop, on_con_lost, threadID, logger=None):
+    def __init__(self, host, port, uid, handler, loop, on_con_lost, logger=None, session_client=None):
         if not callable(handler):
             raise AttributeError("handler is not a function")
         self.host = host
@@ -906,26 +1043,49 @@ class iAlarmMkPushClient(asyncio.Protocol, iAlarmMkClient):
         cmd["Id"] = STR(uid)
         cmd["Err"] = None
         xpath = "/Root/Pair/Push"
-        self.mesg = self._create(xpath, cmd)
+        self.mesg = self._encode(xpath, cmd)
         #self._thread_sockets = dict()
         self.loop = loop
         self.on_con_lost = on_con_lost
         self.transport = None
-        self.threadID = threadID
         self.logger = logger
+        # Client delle richieste, da cui si prende il fuso della centrale letto con GetTime
+        self.session_client = session_client
+        # Stato esplicito della connessione e keepalive pianificato sul loop
+        self.connected = False
+        self._keepalive_handle = None
+        self._parser = iAlarmMkFrameParser()
+        self._frame_handlers = {}
+        # Istante (time.monotonic) dell'ultimo dato ricevuto dalla centrale
+        self.last_frame = None
+        self.register_handler(b"%maI", self._handle_keepalive)
+        self.register_handler(b"@ieM", self._handle_pairing)
+        self.register_handler(b"@alA", self._handle_alarm)
+        self.register_handler(b"!lmX", self._handle_plain_alarm)
 
         # asyncore.dispatcher.__init__(self, map=self._thread_sockets)
 
+    @property
+    def tzinfo(self):
+        '''Fuso della centrale: le date degli allarmi si decodificano come quelle del polling.'''
+        return self.session_client.tzinfo if self.session_client is not None else None
+
     def connection_made(self, transport: asyncio.transports.Transport) -> None:
         self.transport = transport
         self.handle_write()
         self.handle_connect()
 
-    def data_received(self, data: bytes) -> None:
-        return self.handle_read(data)
+    def get_buffer(self, sizehint: int) -> memoryview:
+        # Il transport riceve direttamente nel buffer del parser
+        return self._parser.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes: int) -> None:
+        self._handle_frames(nbytes, self._parser.buffer_updated, nbytes)
 
     def connection_lost(self, exc):
         self._print("iAlarmMkPushClient - connection_lost exception: "+str(exc))
+        self.connected = False
+        self._cancel_keepalive()
         self._close()
 
     def __del__(self):
@@ -945,97 +1105,98 @@ class iAlarmMkPushClient(asyncio.Protocol, iAlarmMkClient):
         return False
 
     def handle_connect(self):
-        #threading.Timer(self.keepalive, self._keepalive).start()
-        timer = threading.Timer(self.keepalive, self._keepalive)
-        random_number = random.randint(100, 999)
-        timer.name = f"{self.threadID}-{random_number}"
-        timer.start()
+        self.connected = True
+        self._schedule_keepalive()
+
+    def _schedule_keepalive(self):
+        '''Pianifica sul loop il prossimo keepalive, sostituendo quello in attesa.'''
+        self._cancel_keepalive()
+        self._keepalive_handle = self.loop.call_later(self.keepalive, self._keepalive)
+
+    def _cancel_keepalive(self):
+        if self._keepalive_handle is not None:
+            self._keepalive_handle.cancel()
+            self._keepalive_handle = None
 
     def handle_error(self):
         self._close()
         raise
 
+    def register_handler(self, head, handler):
+        '''Registra la funzione che gestisce i frame con l'header indicato.'''
+        self._frame_handlers[head] = handler
+
     def handle_read(self, data):
+        '''Gestisce dati ricevuti fuori dal transport, copiandoli nel buffer del parser.'''
+        if type(data) == str:
+            data = data.encode()
+        self._handle_frames(len(data), self._parser.feed, data)
+
+    def _handle_frames(self, size, parse, data):
         try:
-            if type(data) == str:
-                data = data.encode()
-            head = data[0:4]
-
-            # Logging dell'header e della lunghezza dei dati ricevuti
-            self._print(f"iAlarmMkPushClient - handle_read - Header: {head}, Data Length: {len(data)}")
-
-            resp = None
-
-            if head == b"%maI":
-                self._print("iAlarmMkPushClient - handle_read - Keepalive message received.")
-                #threading.Timer(self.keepalive, self._keepalive).start()
-                timer = threading.Timer(self.keepalive, self._keepalive)
-                random_number = random.randint(100, 999)
-                timer.name = f"{self.threadID}-{random_number}"
-                timer.start()
-
-            elif head == b"@ieM":
-                self._print("iAlarmMkPushClient - handle_read - Pairing message received.")
-                xpath = "/Root/Pair/Push"
-                resp = xmltodict.parse(
-                    self._xor(data[16:-4]).decode(),
-                    xml_attribs=False,
-                    dict_constructor=dict,
-                    postprocessor=self._xmlread,
-                )
-                self.push = self._select(resp, xpath)
-                if self.push:
-                    err = self._select(resp, "%s/Err" % xpath)
-                    if err:
-                        self._print("iAlarmMkPushClient - handle_read - Pairing error detected, closing connection.")
-                        self._close()
-                        raise PushClientError("Push subscription error")
-                    else:
-                        self._print("iAlarmMkPushClient - handle_read - Device successfully paired.")
-                else:
-                    self._print("iAlarmMkPushClient - handle_read - No pairing information found.")
-                    xpath = "/Root/Host/Alarm"
-                    self._print(f"iAlarmMkPushClient - handle_read - Set handler - Processed Response: {resp}, xpath: {xpath}")
-                    self.handler(self._select(resp, xpath))
-
-            elif head == b"@alA":
-                self._print("iAlarmMkPushClient - handle_read - Alarm message received.")
-                xpath = "/Root/Host/Alarm"
-                resp = xmltodict.parse(
-                    self._xor(data[16:-4]).decode(),
-                    xml_attribs=False,
-                    dict_constructor=dict,
-                    postprocessor=self._xmlread,
-                )
-                self._print(f"iAlarmMkPushClient - handle_read - Set handler - Processed Response: {resp}, xpath: {xpath}")
-                self.handler(self._select(resp, xpath))
-
-            elif head == b"!lmX":
-                self._print("iAlarmMkPushClient - handle_read - Alternate alarm message received.")
-                xpath = "/Root/Host/Alarm"
-                resp = xmltodict.parse(
-                    data[16:-4],
-                    xml_attribs=False,
-                    dict_constructor=dict,
-                    postprocessor=self._xmlread,
-                )
-                self._print(f"iAlarmMkPushClient - handle_read - Set handler - Processed Response: {resp}, xpath: {xpath}")
-                self.handler(self._select(resp, xpath))
+            self._print(f"iAlarmMkPushClient - handle_read - Data Length: {size}")
+            self.last_frame = time.monotonic()
 
-            else:
-                self._print(f"iAlarmMkPushClient - handle_read - Unrecognized header: {head}, closing connection.")
+            try:
+                frames = parse(data)
+            except ResponseError:
+                self._print("iAlarmMkPushClient - handle_read - Malformed frame, closing connection.")
                 self._close()
-                raise ResponseError("Response error")
+                raise
+
+            for head, _seq, payload in frames:
+                handler = self._frame_handlers.get(head)
+                if handler is None:
+                    self._print(f"iAlarmMkPushClient - handle_read - Unrecognized header: {head}, closing connection.")
+                    self._close()
+                    raise ResponseError("Response error")
+                self._print(f"iAlarmMkPushClient - handle_read - Header: {head}, Payload Length: {len(payload)}")
+                handler(payload)
 
         except Exception as e:
             self._print(f"iAlarmMkPushClient - handle_read - Error: {str(e)}")
             raise
 
+    def _handle_keepalive(self, payload):
+        self._print("iAlarmMkPushClient - handle_read - Keepalive message received.")
+        self._schedule_keepalive()
+
+    def _handle_pairing(self, payload):
+        self._print("iAlarmMkPushClient - handle_read - Pairing message received.")
+        xpath = "/Root/Pair/Push"
+        root = self._parse(self._xor(payload))
+        push = _find_element(root, xpath)
+        self.push = _element_to_value(push) if push is not None else None
+        if self.push:
+            err = self.push.get("Err") if isinstance(self.push, dict) else None
+            if err:
+                self._print("iAlarmMkPushClient - handle_read - Pairing error detected, closing connection.")
+                self._close()
+                raise PushClientError("Push subscription error")
+            else:
+                self._print("iAlarmMkPushClient - handle_read - Device successfully paired.")
+        else:
+            self._print("iAlarmMkPushClient - handle_read - No pairing information found.")
+            self._dispatch_alarm(root)
+
+    def _handle_alarm(self, payload):
+        self._print("iAlarmMkPushClient - handle_read - Alarm message received.")
+        self._dispatch_alarm(self._parse(self._xor(payload)))
+
+    def _handle_plain_alarm(self, payload):
+        self._print("iAlarmMkPushClient - handle_read - Alternate alarm message received.")
+        self._dispatch_alarm(self._parse(payload))
+
+    def _dispatch_alarm(self, root):
+        xpath = "/Root/Host/Alarm"
+        alarm = _find_element(root, xpath)
+        resp = _element_to_value(alarm, self.tzinfo) if alarm is not None else None
+        self._print(f"iAlarmMkPushClient - handle_read - Set handler - Processed Response: {resp}, xpath: {xpath}")
+        self.handler(resp)
+
     def handle_write(self):
         if self.mesg is not None:
-            xml: str = etree.tostring(
-                self._convert_dict_to_xml(self.mesg), pretty_print=False
-            )
+            xml = self.mesg
             mesg = b"@ieM%04d%04d0000%s%04d" % (len(xml), 0, self._xor(xml), 0)
             self.transport.write(mesg)
             self.mesg = None
@@ -1045,14 +1206,21 @@ class iAlarmMkPushClient(asyncio.Protocol, iAlarmMkClient):
 
     def _close(self):
         self._print("Device connection close!")
+        self.connected = False
+        self._cancel_keepalive()
         try:
             if self.transport.is_closing() is False:
                 self.transport.close()
-                self.on_con_lost.set_result(True)
         except Exception as e:
             self._print(e)
+        # Sveglia subito chi supervisiona la connessione, anche se l'ha chiusa la centrale
+        if not self.on_con_lost.done():
+            self.on_con_lost.set_result(True)
 
     def _keepalive(self):
+        self._keepalive_handle = None
+        if not self.connected or self.transport is None or self.transport.is_closing():
+            return
         mesg = b"%maI"
         self.transport.write(mesg)
         self.mesg = None
@@ -1065,12 +1233,16 @@ class iAlarmMkPushClient(asyncio.Protocol, iAlarmMkClient):
             print(str(data))
 
 def BOL(en):
+    if en not in (True, False):
+        raise ValueError(f"Invalid boolean value {en!r}")
     if en == True:
         return "BOL|T"
     else:
         return "BOL|F"
 
 def DTA(t):
+    if isinstance(t, datetime):
+        t = t.timetuple()
     dta = time.strftime("%Y.%m.%d.%H.%M.%S", t)
     return "DTA,%d|%s" % (len(dta), dta)
 
@@ -1081,10 +1253,10 @@ def S32(val, pos=0):
     return "S32,%d,%d|%d" % (pos, pos, val)
 
 def MAC(mac):
-    return "MAC,%d|%d" % (len(mac), mac)
+    return "MAC,%d|%s" % (len(mac), mac)
 
 def IPA(ip):
-    return "IPA,%d|%d" % (len(ip), ip)
+    return "IPA,%d|%s" % (len(ip), ip)
 
 def STR(text):
     text = str(text)
@@ -1096,6 +1268,498 @@ def TYP(val, typ=[]):
     except IndexError:
         return "TYP,NONE,|%d" % val
 
+# Template XML dei comandi, indicizzati per (xpath, nomi dei campi)
+_templates = {}
+
+def _compile_template(xpath, fields):
+    tags = [tag.encode() for tag in xpath.strip("/").split("/")]
+    head = b"".join(b"<%s>" % tag for tag in tags)
+    tail = b"".join(b"</%s>" % tag for tag in reversed(tags))
+    slots = tuple(
+        (b"<%s>" % field.encode(), b"</%s>" % field.encode(), b"<%s/>" % field.encode())
+        for field in fields
+    )
+    return head, slots, tail
+
+def _encode_xml(xpath, cmd):
+    """Costruisce l'XML di un comando riempiendo gli slot del template compilato una sola volta."""
+    key = (xpath, tuple(cmd))
+    template = _templates.get(key)
+    if template is None:
+        template = _templates[key] = _compile_template(xpath, cmd)
+    head, slots, tail = template
+    parts = [head]
+    for (open_tag, close_tag, empty_tag), value in zip(slots, cmd.values()):
+        if value is None:
+            parts.append(empty_tag)
+        else:
+            parts += (open_tag, escape(str(value)).encode("ascii", "xmlcharrefreplace"), close_tag)
+    parts.append(tail)
+    return b"".join(parts)
+
+# Payload già cifrati dei comandi di lettura senza parametri, indicizzati per (xpath, campi)
+# e in ordine di utilizzo, dal meno recente
+_FRAME_CACHE_SIZE = 256
+_frame_cache = OD()
+
+_XOR_KEY = bytes.fromhex(
+    "0c384e4e62382d620e384e4e44382d300f382b382b0c5a6234384e304e4c372b10535a0c20432d171142444e58422c421157322a204036172056446262382b5f0c384e4e62382d620e385858082e232c0f382b382b0c5a62343830304e2e362b10545a0c3e432e1711384e625824371c1157324220402c17204c444e624c2e12"
+)
+_keystream_cache = _XOR_KEY * 32
+
+def _keystream(size):
+    """Restituisce la chiave ripetuta per almeno `size` byte, estendendo la cache se serve."""
+    global _keystream_cache
+    if len(_keystream_cache) < size:
+        _keystream_cache = _XOR_KEY * (size // len(_XOR_KEY) + 1)
+    return _keystream_cache
+
+def _dec_bol(params, data):
+    if data == "T":
+        return True
+    if data == "F":
+        return False
+    raise ValueError(data)
+
+def _dec_dta(params, data):
+    # Formato fisso YYYY.MM.DD.hh.mm.ss: slicing invece di strptime
+    if len(data) != 19:
+        raise ValueError(data)
+    return datetime(
+        int(data[0:4]), int(data[5:7]), int(data[8:10]),
+        int(data[11:13]), int(data[14:16]), int(data[17:19]),
+    )
+
+def _dec_hma(params, data):
+    # Formato fisso hh:mm
+    if len(data) != 5 or data[2] != ":":
+        raise ValueError(data)
+    return dtime(int(data[0:2]), int(data[3:5]))
+
+def _dec_gba(params, data):
+    return bytearray.fromhex(data).decode()
+
+def _dec_int(params, data):
+    return int(data)
+
+def _dec_str(params, data):
+    return data
+
+# Decoder per tipo, indicizzato dal prefisso prima della prima "," o "|".
+_DECODERS = {
+    "BOL": _dec_bol,
+    "DTA": _dec_dta,
+    "ERR": _dec_int,
+    "GBA": _dec_gba,
+    "HMA": _dec_hma,
+    "IPA": _dec_str,
+    "MAC": _dec_str,
+    "NEA": _dec_str,
+    "NUM": _dec_str,
+    "PWD": _dec_str,
+    "S32": _dec_int,
+    "STR": _dec_str,
+    "TYP": _dec_int,
+}
+
+def _batch_commands(commands):
+    """Normalizza i comandi di un batch in coppie (nome, argomenti), verificando che esistano."""
+    normalized = []
+    for command in commands:
+        if isinstance(command, str):
+            name, args = command, ()
+        elif isinstance(command, dict):
+            name, args = command.get("command"), tuple(command.get("args") or ())
+        else:
+            name, args = command[0], tuple(command[1:])
+        if name not in COMMANDS:
+            raise ValueError(f"Unknown command: {name}")
+        if name not in BATCH_COMMANDS:
+            raise ValueError(f"Command not allowed in a batch: {name}")
+        normalized.append((name, args))
+    return normalized
+
+def _list_spec(name):
+    spec = COMMANDS.get(name)
+    if spec is None or not spec.is_list:
+        raise ClientError(f"Command {name} is not a list")
+    return spec
+
+def _cursor_spec(name):
+    if name not in _CURSOR_COMMANDS:
+        raise ClientError(f"Command {name} does not support cursors")
+    return COMMANDS[name]
+
+def _row_time(row):
+    """Data di una voce di GetLog/GetEvents, in UTC: il primo valore datetime al suo interno."""
+    if isinstance(row, dict):
+        for value in row.values():
+            if isinstance(value, datetime):
+                return _as_utc(value)
+    return None
+
+def _row_digest(row):
+    """Hash del contenuto di una voce, stabile tra un download e l'altro."""
+    if isinstance(row, dict):
+        # Le date in UTC: l'hash non dipende dal fuso con cui la voce è stata decodificata
+        row = {key: _as_utc(value) if isinstance(value, datetime) else value for key, value in row.items()}
+    return hashlib.blake2b(repr(row).encode(), digest_size=8).hexdigest()
+
+def _as_utc(when):
+    """Converte una data in UTC. Senza fuso (fuso della centrale non riconosciuto) la si considera già in UTC."""
+    if when.tzinfo is None:
+        return when.replace(tzinfo=timezone.utc)
+    return when.astimezone(timezone.utc)
+
+def _list_cmd():
+    cmd = OD()
+    cmd["Total"] = None
+    cmd["Offset"] = S32(0)
+    cmd["Ln"] = None
+    cmd["Err"] = None
+    return cmd
+
+def _list_page(node, tzinfo=None):
+    """Restituisce (Total, elementi L<n>) di una pagina di un comando lista."""
+    if node is None:
+        return 0, []
+    # Un solo passaggio sui figli: Total, Ln ed elementi L<n> della pagina
+    children = {child.tag: child for child in node if isinstance(child.tag, str)}
+    total = _element_to_value(children["Total"]) if "Total" in children else 0
+    ln = _element_to_value(children["Ln"]) if "Ln" in children else 0
+    items = []
+    for i in range(ln):
+        item = children.get("L%d" % i)
+        items.append(_element_to_value(item, tzinfo) if item is not None else None)
+    return total, items
+
+def _find_element(root, xpath):
+    """Restituisce l'elemento indicato da un xpath assoluto (es. /Root/Host/GetZone) o None."""
+    tags = xpath.strip("/").split("/")
+    if root.tag != tags[0]:
+        return None
+    if len(tags) == 1:
+        return root
+    return root.find("/".join(tags[1:]))
+
+def _element_to_value(elem, tzinfo=None):
+    """Converte un elemento XML in dict annidati con i valori foglia già decodificati."""
+    if len(elem) == 0:
+        text = elem.text.strip() if elem.text else None
+        return _decode_value(text or None, tzinfo)
+    result = {}
+    for child in elem:
+        tag = child.tag
+        if not isinstance(tag, str):
+            # Commenti e processing instruction
+            continue
+        value = _element_to_value(child, tzinfo)
+        if tag not in result:
+            result[tag] = value
+        elif isinstance(result[tag], list):
+            result[tag].append(value)
+        else:
+            result[tag] = [result[tag], value]
+    return result
+
+def _decode_value(value, tzinfo=None):
+    """Decodifica un valore tipizzato del protocollo (es. "S32,0,0|5") in un solo passaggio.
+
+    I valori DTA diventano datetime con il fuso tzinfo della centrale, se noto.
+    """
+    if not isinstance(value, str):
+        return value
+    head, sep, data = value.partition("|")
+    typ, _, params = head.partition(",")
+    decoder = _DECODERS.get(typ)
+    if decoder is None or not sep:
+        raise ResponseError(f"Unknown data type {value}")
+    try:
+        result = decoder(params, data)
+    except (ValueError, TypeError):
+        return value
+    if tzinfo is not None and typ == "DTA":
+        return result.replace(tzinfo=tzinfo)
+    return result
+
+@lru_cache(maxsize=None)
+def _timezone(name, dst=False):
+    """Converte un nome della tabella TZ (es. "GMT+05:30") in un tzinfo a offset fisso."""
+    offset = timedelta()
+    if name != "GMT":
+        if not name.startswith("GMT") or len(name) != 9 or name[6] != ":":
+            raise ValueError(f"Invalid time zone: {name}")
+        offset = timedelta(hours=int(name[4:6]), minutes=int(name[7:9]))
+        if name[3] == "-":
+            offset = -offset
+    if dst:
+        offset += timedelta(hours=1)
+    return timezone(offset, name)
+
+def panel_timezone(info):
+    """Restituisce il fuso della centrale dalla risposta di GetTime (Type è l'indice in TZ) o None."""
+    if not isinstance(info, dict):
+        return None
+    name = TZ.get(info.get("Type"))
+    if name is None:
+        return None
+    return _timezone(name, info.get("Dst") is True)
+
+class _Field:
+    """Campo di un comando: solo risposta (None), valore fisso oppure parametro da codificare."""
+
+    __slots__ = ("name", "value", "arg", "encode", "default")
+
+    def __init__(self, name, value=None, arg=None, encode=None, default=inspect.Parameter.empty):
+        self.name = name
+        self.value = value
+        self.arg = arg
+        self.encode = encode
+        self.default = default
+
+
+class CommandSpec:
+    """Descrizione di un comando /Root/Host/<name>, compilata una volta all'import."""
+
+    def __init__(self, name, fields, is_list=False, cache=None, args=None):
+        self.name = name
+        self.xpath = "/Root/Host/%s" % name
+        self.is_list = is_list
+        self.fields = tuple(self._field(field) for field in fields)
+        # Ordine degli argomenti del metodo, se diverso da quello dei campi nell'XML
+        params = {f.arg: f for f in self.fields if f.arg is not None}
+        # Il payload cifrato va in cache solo per le letture senza parametri (polling):
+        # i comandi con parametri possono contenere password e dati degli utenti
+        self.cache = name.startswith("Get") and not params if cache is None else cache
+        self.signature = inspect.Signature(
+            [
+                inspect.Parameter(arg, inspect.Parameter.POSITIONAL_OR_KEYWORD, default=params[arg].default)
+                for arg in (args or params)
+            ]
+        )
+
+    @staticmethod
+    def _field(field):
+        if isinstance(field, str):
+            return _Field(field)
+        if len(field) == 2:
+            return _Field(field[0], value=field[1])
+        default = field[3] if len(field) > 3 else inspect.Parameter.empty
+        return _Field(field[0], arg=field[1], encode=field[2], default=default)
+
+    def build(self, *args, **kwargs):
+        """Restituisce il dict del comando con i parametri validati e codificati."""
+        try:
+            bound = self.signature.bind(*args, **kwargs)
+        except TypeError as e:
+            raise ClientError(f"{self.name}: {e}")
+        bound.apply_defaults()
+        cmd = OD()
+        for f in self.fields:
+            if f.arg is None:
+                cmd[f.name] = f.value
+                continue
+            value = bound.arguments[f.arg]
+            try:
+                cmd[f.name] = f.encode(value)
+            except (TypeError, ValueError, AttributeError) as e:
+                raise ClientError(f"{self.name}: invalid value {value!r} for {f.name} ({e})")
+        return cmd
+
+
+def _s32(pos):
+    return lambda val: S32(val, pos)
+
+def _typ(names):
+    return lambda val: TYP(val, names)
+
+def _typ_fixed(prefix):
+    return lambda val: "TYP,%s|%d" % (prefix, val)
+
+def _str_hex(text):
+    return STR(text[:7].encode().hex())
+
+_S32_1 = _s32(1)
+_LIST = ("Total", ("Offset", S32(0)), "Ln", "Err")
+# Comandi le cui risposte contengono valori DTA
+_DATED_COMMANDS = frozenset(("GetEvents", "GetLog"))
+# Comandi lista scaricabili in modo incrementale con iAlarmMkLogCursor
+_CURSOR_COMMANDS = _DATED_COMMANDS
+
+# Schema dei comandi: nome, campi (nell'ordine dell'XML) e se la risposta è paginata.
+# Un campo è il solo nome (valore letto dalla risposta), (nome, valore fisso)
+# oppure (nome, argomento, codifica[, default]).
+COMMANDS = {
+    spec.name: spec
+    for spec in (
+        CommandSpec("GetAlarmStatus", ("DevStatus", "Err")),
+        CommandSpec("GetByWay", _LIST, is_list=True),
+        CommandSpec("GetDefense", _LIST, is_list=True),
+        CommandSpec("GetEmail", ("Ip", "Port", "User", "Pwd", "EmailSend", "EmailRecv", "Err")),
+        CommandSpec("GetEvents", _LIST, is_list=True),
+        CommandSpec("GetGprs", ("Apn", "User", "Pwd", "Err")),
+        CommandSpec("GetLog", _LIST, is_list=True),
+        CommandSpec("GetNet", ("Mac", "Name", "Ip", "Gate", "Subnet", "Dns1", "Dns2", "Err")),
+        CommandSpec("GetOverlapZone", _LIST, is_list=True),
+        CommandSpec("GetPairServ", ("Ip", "Port", "Id", "Pwd", "Err")),
+        CommandSpec("GetPhone", ("Total", ("Offset", S32(0)), "Ln", "RepeatCnt", "Err"), is_list=True),
+        CommandSpec("GetRemote", _LIST, is_list=True),
+        CommandSpec("GetRfid", _LIST, is_list=True),
+        CommandSpec("GetRfidType", _LIST, is_list=True),
+        CommandSpec("GetSendby", (("Cid", "cid", STR), "Tel", "Voice", "Sms", "Email", "Err")),
+        CommandSpec("GetSensor", _LIST, is_list=True),
+        CommandSpec("GetServ", ("En", "Ip", "Port", "Name", "Pwd", "Cnt", "Err")),
+        CommandSpec("GetSwitch", _LIST, is_list=True),
+        CommandSpec("GetSwitchInfo", _LIST, is_list=True),
+        CommandSpec(
+            "GetSys",
+            (
+                "InDelay", "OutDelay", "AlarmTime", "WlLoss", "AcLoss", "ComLoss", "ArmVoice",
+                "ArmReport", "ForceArm", "DoorCheck", "BreakCheck", "AlarmLimit", "Err",
+            ),
+        ),
+        CommandSpec("GetTel", ("En", "Code", "Cnt") + _LIST, is_list=True),
+        CommandSpec("GetTime", ("En", "Name", "Type", "Time", "Dst", "Err")),
+        CommandSpec("GetVoiceType", _LIST, is_list=True),
+        CommandSpec("GetZone", _LIST, is_list=True),
+        CommandSpec("GetZoneType", _LIST, is_list=True),
+        CommandSpec("WlsStudy", ("Err",)),
+        CommandSpec("ConfigWlWaring", ("Err",)),
+        CommandSpec("FskStudy", (("Study", "en", BOL), "Err")),
+        CommandSpec("GetWlsStatus", (("Num", "num", S32), "Bat", "Tamp", "Status", "Err")),
+        CommandSpec("DelWlsDev", (("Num", "num", S32), "Err")),
+        CommandSpec("WlsSave", (("Type", "typ", _typ_fixed("NO")), ("Num", "num", _S32_1), ("Code", "code", STR), "Err")),
+        # Risposta paginata, ma restituita così com'è (Total/Ln/L<n>)
+        CommandSpec("GetWlsList", _LIST),
+        CommandSpec("SwScan", ("Err",)),
+        CommandSpec("Reset", (("Ret", "ret", BOL), "Err")),
+        CommandSpec("OpSwitch", (("Pos", "pos", _S32_1), ("En", "en", BOL), "Err")),
+        CommandSpec(
+            "SetAlarmStatus",
+            (("DevStatus", "status", _typ(["ARM", "DISARM", "STAY", "CLEAR", "", "", "", "", "PARTIAL"])), "Err"),
+        ),
+        CommandSpec("SetByWay", (("Pos", "pos", _S32_1), ("En", "en", BOL), "Err")),
+        CommandSpec(
+            "SetDefense",
+            (("Pos", "pos", _S32_1), ("Def", "hmdef", STR, "00:00"), ("Undef", "hmundef", STR, "00:00"), "Err"),
+        ),
+        CommandSpec(
+            "SetEmail",
+            (
+                ("Ip", "ip", STR), ("Port", "port", S32), ("User", "user", STR), ("Pwd", "pwd", PWD),
+                ("EmailSend", "emailsend", STR), ("EmailRecv", "emailrecv", STR), "Err",
+            ),
+        ),
+        CommandSpec("SetGprs", (("Apn", "apn", STR), ("User", "user", STR), ("Pwd", "pwd", PWD), "Err")),
+        CommandSpec(
+            "SetNet",
+            (
+                ("Mac", "mac", MAC), ("Name", "name", STR), ("Ip", "ip", IPA), ("Gate", "gate", IPA),
+                ("Subnet", "subnet", IPA), ("Dns1", "dns1", IPA), ("Dns2", "dns2", IPA), "Err",
+            ),
+        ),
+        CommandSpec(
+            "SetOverlapZone",
+            (
+                ("Pos", "pos", _S32_1), ("Zone1", "zone1", _S32_1), ("Zone2", "zone2", _S32_1),
+                ("Time", "time", _S32_1), "Err",
+            ),
+        ),
+        CommandSpec(
+            "SetPairServ",
+            (("Ip", "ip", IPA), ("Port", "port", _S32_1), ("Id", "uid", STR), ("Pwd", "pwd", PWD), "Err"),
+        ),
+        CommandSpec("SetPhone", (("Type", TYP(1, ["F", "L"])), ("Pos", "pos", _S32_1), ("Num", "num", STR), "Err")),
+        CommandSpec(
+            "SetRfid",
+            (
+                ("Pos", "pos", _S32_1), ("Type", "typ", _typ(["NO", "DS", "HS", "DM", "HM", "DC"])),
+                ("Code", "code", STR), ("Msg", "msg", STR), "Err",
+            ),
+            args=("pos", "code", "typ", "msg"),
+        ),
+        CommandSpec("SetRemote", (("Pos", "pos", _S32_1), ("Code", "code", STR), "Err")),
+        CommandSpec(
+            "SetSendby",
+            (
+                ("Cid", "cid", STR), ("Tel", "tel", BOL), ("Voice", "voice", BOL), ("Sms", "sms", BOL),
+                ("Email", "email", BOL), "Err",
+            ),
+        ),
+        CommandSpec("SetSensor", (("Pos", "pos", _S32_1), ("Code", "code", STR), "Err")),
+        CommandSpec(
+            "SetServ",
+            (
+                ("En", "en", BOL), ("Ip", "ip", STR), ("Port", "port", _S32_1), ("Name", "name", STR),
+                ("Pwd", "pwd", PWD), ("Cnt", "cnt", _S32_1), "Err",
+            ),
+        ),
+        CommandSpec("SetSwitch", (("Pos", "pos", _S32_1), ("Code", "code", STR), "Err")),
+        CommandSpec(
+            "SetSwitchInfo",
+            (
+                ("Pos", "pos", _S32_1), ("Name", "name", _str_hex), ("Open", "hmopen", STR, "00:00"),
+                ("Close", "hmclose", STR, "00:00"), "Err",
+            ),
+        ),
+        CommandSpec(
+            "SetSys",
+            (
+                ("InDelay", "indelay", _S32_1), ("OutDelay", "outdelay", _S32_1),
+                ("AlarmTime", "alarmtime", _S32_1), ("WlLoss", "wlloss", _S32_1),
+                ("AcLoss", "acloss", _S32_1), ("ComLoss", "comloss", _S32_1),
+                ("ArmVoice", "armvoice", BOL), ("ArmReport", "armreport", BOL),
+                ("ForceArm", "forcearm", BOL), ("DoorCheck", "doorcheck", BOL),
+                ("BreakCheck", "breakcheck", BOL), ("AlarmLimit", "alarmlimit", BOL), "Err",
+            ),
+        ),
+        CommandSpec(
+            "SetTel",
+            (("Typ", TYP(0, ["F", "L"])), ("En", "en", BOL), ("Code", "code", int), ("Cnt", "cnt", _S32_1), "Err"),
+        ),
+        CommandSpec(
+            "SetTime",
+            (
+                ("En", "en", BOL), ("Name", "name", STR), ("Type", "typ", _typ_fixed("0")),
+                ("Time", "time", DTA), ("Dst", "dst", BOL), "Err",
+            ),
+        ),
+        CommandSpec(
+            "SetZone",
+            (
+                ("Pos", "pos", _S32_1),
+                ("Type", "typ", _typ(["NO", "DE", "SI", "IN", "FO", "HO24", "FI", "KE", "GAS", "WT"])),
+                ("Voice", "voice", _typ(["CX", "MC", "NO"])), ("Name", "name", STR), ("Bell", "bell", BOL),
+                "Err",
+            ),
+        ),
+    )
+}
+
+# Comandi ammessi nei batch: letture e impostazioni. Sono esclusi il reset, la gestione
+# dei dispositivi radio e i comandi che spostano la centrale su un'altra rete o server
+_BATCH_EXCLUDED = frozenset(
+    ("Reset", "SetNet", "SetPairServ", "SetServ", "WlsStudy", "WlsSave", "DelWlsDev", "FskStudy", "ConfigWlWaring", "SwScan")
+)
+BATCH_COMMANDS = frozenset(
+    name for name in COMMANDS if name.startswith(("Get", "Set")) and name not in _BATCH_EXCLUDED
+)
+
+def _command_method(spec):
+    def command(self, *args, **kwargs):
+        return self._run_command(spec, spec.build(*args, **kwargs))
+
+    command.__name__ = command.__qualname__ = spec.name
+    command.__doc__ = f"Comando {spec.xpath}."
+    command.__signature__ = spec.signature.replace(
+        parameters=[inspect.Parameter("self", inspect.Parameter.POSITIONAL_OR_KEYWORD), *spec.signature.parameters.values()]
+    )
+    return command
+
+# I metodi Get*/Set* di iAlarmMkClient (e delle sue sottoclassi) sono generati dallo schema
+for _spec in COMMANDS.values():
+    setattr(iAlarmMkClient, _spec.name, _command_method(_spec))
+
 Cid = {
     "1100": "Personal ambulance",
     "1101": "Emergency",
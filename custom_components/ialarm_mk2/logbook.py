@@ -0,0 +1,65 @@
+"""Descrizione degli eventi iAlarm-MK nel logbook."""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+from typing import Any
+
+from homeassistant.components.logbook import LOGBOOK_ENTRY_MESSAGE, LOGBOOK_ENTRY_NAME
+from homeassistant.core import Event, HomeAssistant, callback
+
+from .const import DOMAIN
+from .coordinator import iAlarmMk2Coordinator
+from .libpyialarmmk.pyialarmmk import Cid
+
+
+@callback
+def async_describe_events(
+    hass: HomeAssistant,
+    async_describe_event: Callable[[str, str, Callable[[Event], dict[str, str]]], None],
+) -> None:
+    """Descrive gli eventi push e le voci del registro della centrale."""
+
+    @callback
+    def async_describe_panel_event(event: Event) -> dict[str, str]:
+        """Compone il messaggio dalla riga dell'archivio locale, senza interrogare la centrale."""
+        stored = _stored_row(hass, event)
+        if stored is None:
+            # Evento non (ancora) archiviato: bastano i suoi dati
+            message = _message(event.data)
+        else:
+            message = _message(stored["data"], stored["user"])
+        return {
+            LOGBOOK_ENTRY_NAME: "iAlarm-MK",
+            LOGBOOK_ENTRY_MESSAGE: message,
+        }
+
+    async_describe_event(DOMAIN, "ialarm_mk2_event", async_describe_panel_event)
+    async_describe_event(DOMAIN, "ialarm_mk2_log", async_describe_panel_event)
+
+
+def _stored_row(hass: HomeAssistant, event: Event) -> dict[str, Any] | None:
+    """Riga dell'archivio locale corrispondente all'evento, se presente."""
+    source = "push" if event.event_type == "ialarm_mk2_event" else event.data.get("source")
+    if source is None:
+        return None
+    for coordinator in hass.data.get(DOMAIN, {}).values():
+        if isinstance(coordinator, iAlarmMk2Coordinator):
+            stored = coordinator.event_store.lookup(source, event.data)
+            if stored is not None:
+                return stored
+    return None
+
+
+def _message(data: dict[str, Any], user: int | None = None) -> str:
+    content = data.get("Content") or Cid.get(str(data.get("Cid")), "event")
+    # Utente ricavato dall'archivio per inserimenti e disinserimenti (Contact ID 4xx)
+    if user is not None:
+        return f"{content} (user {user})"
+    zone_name = data.get("ZoneName")
+    if zone_name:
+        return f"{content} ({zone_name})"
+    zone = data.get("Zone")
+    if zone is not None:
+        return f"{content} (zone {zone})"
+    return str(content)
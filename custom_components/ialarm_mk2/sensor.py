@@ -0,0 +1,108 @@
+"""Sensori diagnostici della centrale."""
+
+import logging
+
+from homeassistant.components.sensor import SensorDeviceClass, SensorEntity
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import EntityCategory, UnitOfTime
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .const import DOMAIN
+from .coordinator import iAlarmMk2Coordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+async def async_setup_entry(
+    hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
+) -> None:
+    """Set up diagnostic sensors based on a config entry."""
+    _LOGGER.info("Set up diagnostic sensors based on a config entry.")
+    coordinator: iAlarmMk2Coordinator = hass.data[DOMAIN][entry.entry_id]
+    async_add_entities(
+        [
+            IAlarmMkLastPollSensor(coordinator),
+            IAlarmMkPollIntervalSensor(coordinator),
+            IAlarmMkPushConnectionSensor(coordinator),
+        ]
+    )
+
+class IAlarmMkLastPollSensor(CoordinatorEntity[iAlarmMk2Coordinator], SensorEntity):
+    """Istante dell'ultima lettura riuscita delle zone, unico segnale di freschezza della centrale."""
+
+    _attr_has_entity_name = True
+    _attr_name = "Last poll"
+    _attr_device_class = SensorDeviceClass.TIMESTAMP
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, coordinator: iAlarmMk2Coordinator) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{coordinator.hub.mac}_last_poll"
+        self._attr_device_info = coordinator.hub.device_info
+
+    @property
+    def native_value(self):
+        """Ritorna l'istante dell'ultima lettura riuscita."""
+        return self.coordinator.last_poll
+
+class IAlarmMkPollIntervalSensor(CoordinatorEntity[iAlarmMk2Coordinator], SensorEntity):
+    """Intervallo di polling scelto dal coordinator in base a stato e canale push."""
+
+    _attr_has_entity_name = True
+    _attr_name = "Poll interval"
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_native_unit_of_measurement = UnitOfTime.SECONDS
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, coordinator: iAlarmMk2Coordinator) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{coordinator.hub.mac}_poll_interval"
+        self._attr_device_info = coordinator.hub.device_info
+
+    @property
+    def native_value(self):
+        """Ritorna l'intervallo di polling corrente in secondi."""
+        return int(self.coordinator.update_interval.total_seconds())
+
+class IAlarmMkPushConnectionSensor(CoordinatorEntity[iAlarmMk2Coordinator], SensorEntity):
+    """Stato della connessione push con le statistiche di riconnessione del supervisore."""
+
+    _attr_has_entity_name = True
+    _attr_name = "Push connection"
+    _attr_device_class = SensorDeviceClass.ENUM
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    # Valori che cambiano a ogni aggiornamento, inutili nello storico
+    _unrecorded_attributes = frozenset({"connected_time", "last_frame_age"})
+
+    def __init__(self, coordinator: iAlarmMk2Coordinator) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{coordinator.hub.mac}_push_connection"
+        self._attr_device_info = coordinator.hub.device_info
+        ialarmmk = coordinator.hub.ialarmmk
+        self._attr_options = [
+            ialarmmk.PUSH_STOPPED,
+            ialarmmk.PUSH_CONNECTING,
+            ialarmmk.PUSH_CONNECTED,
+            ialarmmk.PUSH_BACKOFF,
+        ]
+
+    async def async_added_to_hass(self) -> None:
+        """Aggiorna lo stato a ogni cambio della connessione push, non solo ai polling."""
+        await super().async_added_to_hass()
+        self.async_on_remove(self.coordinator.hub.ialarmmk.add_push_listener(self.async_write_ha_state))
+
+    @property
+    def native_value(self):
+        """Ritorna lo stato corrente della connessione push."""
+        return self.coordinator.hub.ialarmmk.push_state
+
+    @property
+    def extra_state_attributes(self):
+        """Ritorna contatori di connessioni, tempo connesso, età dell'ultimo frame e ultimo errore."""
+        stats = dict(self.coordinator.hub.ialarmmk.push_stats)
+        stats.pop("state")
+        return stats
@@ -0,0 +1,152 @@
+"""Servizi dell'integrazione iAlarm-MK Integration 2."""
+
+from __future__ import annotations
+
+import logging
+
+import voluptuous as vol
+
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+)
+from homeassistant.exceptions import HomeAssistantError, Unauthorized, UnknownUser
+from homeassistant.helpers import config_validation as cv
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN
+from .coordinator import iAlarmMk2Coordinator
+from .event_store import QUERY_LIMIT
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_EXECUTE_BATCH = "execute_batch"
+SERVICE_QUERY_EVENTS = "query_events"
+
+ATTR_COMMANDS = "commands"
+ATTR_COMMAND = "command"
+ATTR_ARGS = "args"
+ATTR_START = "start"
+ATTR_END = "end"
+ATTR_CID = "cid"
+ATTR_ZONE = "zone"
+ATTR_USER = "user"
+ATTR_SOURCE = "source"
+ATTR_LIMIT = "limit"
+
+EXECUTE_BATCH_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_COMMANDS): vol.All(
+            cv.ensure_list,
+            [
+                vol.Any(
+                    cv.string,
+                    vol.Schema(
+                        {
+                            vol.Required(ATTR_COMMAND): cv.string,
+                            vol.Optional(ATTR_ARGS, default=[]): vol.All(cv.ensure_list, list),
+                        }
+                    ),
+                )
+            ],
+        ),
+    }
+)
+
+QUERY_EVENTS_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_START): cv.datetime,
+        vol.Optional(ATTR_END): cv.datetime,
+        vol.Optional(ATTR_CID): vol.Coerce(int),
+        vol.Optional(ATTR_ZONE): vol.Coerce(int),
+        vol.Optional(ATTR_USER): vol.Coerce(int),
+        vol.Optional(ATTR_SOURCE): vol.In(["push", "GetEvents", "GetLog"]),
+        vol.Optional(ATTR_LIMIT, default=QUERY_LIMIT): vol.All(vol.Coerce(int), vol.Range(min=1, max=10000)),
+    }
+)
+
+
+async def _async_check_admin(hass: HomeAssistant, call: ServiceCall) -> None:
+    """Consente la chiamata solo agli amministratori, come i servizi admin di Home Assistant.
+
+    async_register_admin_service non restituisce la risposta del servizio,
+    per questo il controllo è fatto qui.
+    """
+    if not call.context.user_id:
+        # Chiamate interne (automazioni, script)
+        return
+    user = await hass.auth.async_get_user(call.context.user_id)
+    if user is None:
+        raise UnknownUser(context=call.context)
+    if not user.is_admin:
+        raise Unauthorized(context=call.context)
+
+
+def _get_coordinator(hass: HomeAssistant) -> iAlarmMk2Coordinator:
+    """Restituisce il coordinator della config entry caricata."""
+    for coordinator in hass.data.get(DOMAIN, {}).values():
+        if isinstance(coordinator, iAlarmMk2Coordinator):
+            return coordinator
+    raise HomeAssistantError("iAlarm-MK integration is not loaded")
+
+
+async def async_setup_services(hass: HomeAssistant) -> None:
+    """Registra i servizi dell'integrazione."""
+    if hass.services.has_service(DOMAIN, SERVICE_EXECUTE_BATCH):
+        return
+
+    async def async_execute_batch(call: ServiceCall) -> ServiceResponse:
+        """Esegue una lista di comandi Get/Set con un solo login, solo per gli amministratori."""
+        await _async_check_admin(hass, call)
+        coordinator = _get_coordinator(hass)
+        commands = call.data[ATTR_COMMANDS]
+        _LOGGER.debug("Executing batch of %s commands.", len(commands))
+        try:
+            results = await coordinator.hub.ialarmmk.session.batch(commands)
+        except ValueError as e:
+            raise HomeAssistantError(str(e)) from e
+
+        # I comandi Set possono cambiare lo stato delle zone o dell'allarme
+        if any(result["command"].startswith("Set") and result["error"] is None for result in results):
+            await coordinator.async_request_refresh()
+
+        return {"results": results}
+
+    async def async_query_events(call: ServiceCall) -> ServiceResponse:
+        """Legge eventi e registri dall'archivio locale, senza interrogare la centrale."""
+        coordinator = _get_coordinator(hass)
+        start = call.data.get(ATTR_START)
+        end = call.data.get(ATTR_END)
+        events = await coordinator.event_store.async_query(
+            start=dt_util.as_local(start) if start else None,
+            end=dt_util.as_local(end) if end else None,
+            cid=call.data.get(ATTR_CID),
+            zone=call.data.get(ATTR_ZONE),
+            user=call.data.get(ATTR_USER),
+            source=call.data.get(ATTR_SOURCE),
+            limit=call.data[ATTR_LIMIT],
+        )
+        return {"events": events}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_EXECUTE_BATCH,
+        async_execute_batch,
+        schema=EXECUTE_BATCH_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_QUERY_EVENTS,
+        async_query_events,
+        schema=QUERY_EVENTS_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+
+
+def async_unload_services(hass: HomeAssistant) -> None:
+    """Rimuove i servizi dell'integrazione."""
+    hass.services.async_remove(DOMAIN, SERVICE_EXECUTE_BATCH)
+    hass.services.async_remove(DOMAIN, SERVICE_QUERY_EVENTS)
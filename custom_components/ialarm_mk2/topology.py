@@ -0,0 +1,62 @@
+"""Cache su disco della configurazione della centrale (rete, sensori e zone)."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.device_registry import format_mac
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, STORAGE_VERSION
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def build_topology(net: dict[str, Any], sensors: list, zones: list) -> dict[str, Any]:
+    """Compone la topologia con la sua impronta: numero di sensori e zone più hash del contenuto."""
+    topology = {
+        "net": {"Mac": net.get("Mac"), "Name": net.get("Name")},
+        "sensors": sensors,
+        "zones": zones,
+    }
+    content = json.dumps(topology, sort_keys=True, default=str).encode()
+    topology["fingerprint"] = {
+        "sensors": len(sensors),
+        "zones": len(zones),
+        "hash": hashlib.blake2b(content, digest_size=16).hexdigest(),
+    }
+    return topology
+
+
+class IAlarmMkTopologyCache:
+    """Salva la topologia di una centrale per creare le entità senza interrogarla all'avvio."""
+
+    def __init__(self, hass: HomeAssistant, panel: str) -> None:
+        """Inizializza la cache per la centrale indicata.
+
+        Tutte le centrali raggiunte tramite il relay cloud hanno lo stesso host:port,
+        per questo la chiave è l'identificativo della centrale (l'utente).
+        """
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.topology.{panel}")
+
+    async def async_load(self, mac: str | None = None) -> dict[str, Any] | None:
+        """Restituisce la topologia salvata o None se manca, non è valida o è di un'altra centrale."""
+        data = await self._store.async_load()
+        if not data or not {"net", "sensors", "zones", "fingerprint"} <= data.keys():
+            return None
+        if not data["net"].get("Mac"):
+            return None
+        if mac is not None and format_mac(data["net"]["Mac"]) != mac:
+            _LOGGER.info("Discarding cached topology of another panel (%s).", data["net"]["Mac"])
+            await self._store.async_remove()
+            return None
+        return data
+
+    async def async_save(self, topology: dict[str, Any]) -> None:
+        """Salva la topologia letta dalla centrale."""
+        _LOGGER.debug("Saving panel topology, fingerprint: %s", topology["fingerprint"])
+        await self._store.async_save(topology)